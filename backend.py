@@ -1,14 +1,24 @@
+import argparse
 import json
-import pandas as pd
-import numpy as np
+import logging
 from datetime import datetime
 import threading
 import time
 import os
+import queue
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+import logzero
 from logzero import logger
 import traceback
-import sys
+from indicators import AlmaEngine, ALMA_PERIOD, ALMA_OFFSET, ALMA_SIGMA
+from bars import BarStore, MultiBarBuilder, BAR_TYPE, EXTRA_BAR_TYPES, BAR_RETENTION
+from snapshot import SnapshotWriter, snapshot_path
+from journal import BarJournal, journal_path
+from control import ControlServer
+from reconnect import Backoff, GapTracker, STABLE_CONNECTION_SECONDS
+from latency import get_recorder, now_ns
+from tickstore import TickRecorder, TICK_STORE_ENABLED, load_replay
+from warmstart import WARM_SOURCES, load_history, warm_store
 
 import sys
 
@@ -17,35 +27,425 @@ import sys
 default_exchange = 5
 default_token = "472789"
 
-# Load from arguments if provided
-exchange_type = int(sys.argv[1]) if len(sys.argv) > 1 else default_exchange
-token_id = sys.argv[2] if len(sys.argv) > 2 else default_token
-
-TICK_BAR_SIZE = 5
-ALMA_PERIOD = 200
-TOKEN_LIST = [{"exchangeType": exchange_type, "tokens": [token_id]}]
-CORRELATION_ID = f"backend_{token_id}"
-DATA_FILE = "market_data.json"
+DEFAULT_TOKEN_LIST = [{"exchangeType": default_exchange, "tokens": [default_token]}]
+DATA_FILE = "market_data_{token}.json"
 STOP_FILE = "stop_backend.txt"
+# Bar events queued for one strategy runner before it is treated as stalled and dropped
+EVENT_QUEUE_LIMIT = int(os.environ.get("EVENT_QUEUE_LIMIT", 10000))
+# Per-tick logs are DEBUG; set BACKEND_LOG_LEVEL=DEBUG to see them
+logzero.loglevel(getattr(logging, os.environ.get("BACKEND_LOG_LEVEL", "INFO").upper(), logging.INFO))
+
+# Tick -> bar close/ALMA -> publish timings, exported to latency_backend.json/.prom
+latency = get_recorder("backend")
+
+
+def parse_token_list(args):
+    """
+    Builds a SmartWebSocketV2 TOKEN_LIST from `exchange_type token[,token...]` pairs, e.g.
+    `backend.py 5 472789 2 43210,43211` tracks one MCX and two NFO tokens in one process.
+    """
+    if not args:
+        return DEFAULT_TOKEN_LIST
+    if len(args) == 1:
+        args = [args[0], default_token]
+    if len(args) % 2:
+        raise ValueError("Arguments must be `exchange_type token[,token...]` pairs")
+
+    grouped = {}
+    for exch, tokens in zip(args[::2], args[1::2]):
+        bucket = grouped.setdefault(int(exch), [])
+        for tok in tokens.split(","):
+            tok = tok.strip()
+            if tok and tok not in bucket:
+                bucket.append(tok)
+    return [{"exchangeType": exch, "tokens": tokens} for exch, tokens in grouped.items()]
+
+
+def replay_token_list(ticks, tokens):
+    """TOKEN_LIST covering every token in a replay, with its recorded exchange type."""
+    grouped = {}
+    for tok in dict.fromkeys(tokens.tolist()):
+        exch = int(ticks["exchange_type"][tokens == tok][0]) or default_exchange
+        grouped.setdefault(exch, []).append(tok)
+    return [{"exchangeType": exch, "tokens": toks} for exch, toks in grouped.items()]
+
+
+def data_file(token_id):
+    return DATA_FILE.format(token=token_id)
+
 
 # ================= STATE & LOGIC =================
+class BarSeries:
+    """Bars, ALMA and journal of one extra bar type (EXTRA_BAR_TYPES) for a token."""
+
+    def __init__(self, spec, token_id, exchange_type):
+        self.spec = spec
+        self.bars = BarStore(BAR_RETENTION)
+        self.alma = AlmaEngine(ALMA_PERIOD, ALMA_OFFSET, ALMA_SIGMA)
+        # e.g. market_data_472789_time60.journal next to the primary journal
+        self.journal = BarJournal(journal_path(f"{token_id}_{spec.replace(':', '')}"), BAR_RETENTION,
+                                  token_id, exchange_type, spec)
+        self.pending_gap = 0.0
+
+    def append(self, bar):
+        chart_time, open_, high, low, close, volume = bar
+        self.bars.append(chart_time, open_, high, low, close, volume, self.alma.update(close), self.pending_gap)
+        self.pending_gap = 0.0
+
+    def save_data(self):
+        self.journal.append_from(self.bars)
+
+    def close(self):
+        self.journal.close()
+
+
+class InstrumentState:
+    """Bar builders, indicator state and publishers for one subscribed token."""
+
+    def __init__(self, token_id, exchange_type, warm_sources=()):
+        self.token_id = str(token_id)
+        self.exchange_type = int(exchange_type)
+        # Every bar type is built in the same pass over the ticks; the first (BAR_TYPE)
+        # drives ALMA, the snapshot, the journal and strategy events
+        self.builders = MultiBarBuilder([BAR_TYPE] + EXTRA_BAR_TYPES)
+        self.extra = [BarSeries(spec, self.token_id, self.exchange_type) for spec in self.builders.specs[1:]]
+        # Columnar ring buffer holding OHLC + ALMA, bounded to BAR_RETENTION bars
+        self.bars = BarStore(BAR_RETENTION)
+        self.alma = AlmaEngine(ALMA_PERIOD, ALMA_OFFSET, ALMA_SIGMA)
+        self.latest_ltp = 0.0
+        self.pending_gap = 0.0  # feed outage to stamp on the next bar
+        self.last_tick_ns = 0   # monotonic arrival time of the latest tick
+        self.feed_time = None   # exchange timestamp of the latest tick, paired with its arrival
+        self.feed_mono = 0.0
+        self.bar_ns = 0         # monotonic time the latest bar (and its ALMA) was closed
+        self.unpublished = []   # latency timeline ids of bars closed since the last publish
+        self.snapshot = self.open_snapshot()
+        # Append-only bar log on disk; writes cost O(new bars) instead of O(history)
+        self.journal = BarJournal(journal_path(self.token_id), BAR_RETENTION, self.token_id, self.exchange_type,
+                                  self.bar_type)
+        if warm_sources:
+            self.warm_start(warm_sources)
+
+    @property
+    def bar_type(self):
+        return self.builders.specs[0]
+
+    def open_snapshot(self):
+        # Binary shared-memory channel; the JSON status file is only written if this fails
+        try:
+            return SnapshotWriter(snapshot_path(self.token_id), BAR_RETENTION, self.token_id, self.exchange_type)
+        except Exception as e:
+            logger.error(f"[{self.token_id}] Snapshot channel unavailable, falling back to JSON: {e}")
+            return None
+
+    def warm_start(self, sources):
+        """Load prior bars into every series before the first live tick, so ALMA is valid immediately."""
+        series = [(self.bar_type, self)] + [(s.spec, s) for s in self.extra]
+        for spec, target in series:
+            history, source = load_history(self.token_id, self.exchange_type, spec, sources,
+                                           journal=target.journal.path)
+            if not len(history):
+                logger.warning(f"[{self.token_id}] No history for {spec}; ALMA starts from a running mean")
+                continue
+            warm_store(target.bars, target.alma, history)
+            # Time since the last historical bar is shown as a gap on the first live one
+            target.pending_gap = max(0.0, time.time() - float(history["time"][-1]))
+            logger.info(f"[{self.token_id}] Warm start: {len(history)} {spec} bars from {source}, "
+                        f"ALMA {target.alma.value:.2f} ({'ready' if target.alma.ready else 'warming up'})")
+
+    def mark_gap(self, seconds):
+        self.pending_gap += seconds
+        for series in self.extra:
+            series.pending_gap += seconds
+
+    def add_tick(self, ltp, qty, ts, recv_ns=None):
+        """Feeds one tick to every bar builder; returns how many primary bars it closed."""
+        self.latest_ltp = ltp
+        self.last_tick_ns = recv_ns or now_ns()
+        # Raw UTC timestamps for chart consistency
+        self.feed_time = ts.timestamp()
+        self.feed_mono = time.monotonic()
+        return self.close_bars(self.builders.update(ltp, qty, self.feed_time))
+
+    def poll(self):
+        """Closes time bars whose interval has ended without a later tick; returns primary bars closed."""
+        if self.feed_time is None:
+            return 0
+        # Advance the feed's own clock (exchange time, or replayed time) rather than the wall clock
+        return self.close_bars(self.builders.poll(self.feed_time + time.monotonic() - self.feed_mono))
+
+    def close_bars(self, closed):
+        for series, bars in zip(self.extra, closed[1:]):
+            for bar in bars:
+                series.append(bar)
+
+        primary = closed[0]
+        for chart_time, open_, high, low, close, volume in primary:
+            # ALMA Logic (Arnaud Legoux Moving Average - 200 period)
+            # Incremental engine: falls back to a simple mean until 200 bars exist
+            alma_val = self.alma.update(close)
+            # Oldest bar is evicted automatically once BAR_RETENTION is reached
+            self.bars.append(chart_time, open_, high, low, close, volume, alma_val, self.pending_gap)
+            self.pending_gap = 0.0
+
+            corr_id = f"{self.token_id}:{self.bars.total - 1}"
+            latency.stamp(corr_id, "recv", self.last_tick_ns)
+            self.bar_ns = now_ns()
+            latency.stamp(corr_id, "bar", self.bar_ns)
+            self.unpublished.append(corr_id)
+        return len(primary)
+
+    def published(self):
+        t_ns = now_ns()
+        for corr_id in self.unpublished:
+            latency.finish(corr_id, "publish", t_ns)
+        self.unpublished.clear()
+
+    def save_data(self):
+        try:
+            self.journal.append_from(self.bars)
+            for series in self.extra:
+                series.save_data()
+        except Exception as e:
+            logger.error(f"[{self.token_id}] Journal write error: {e}")
+
+        if self.snapshot is not None:
+            try:
+                self.snapshot.publish(self.latest_ltp, self.alma.value, self.bars, self.last_tick_ns)
+                self.published()
+                return
+            except Exception as e:
+                logger.error(f"[{self.token_id}] Snapshot publish error, falling back to JSON: {e}")
+                self.snapshot.close()
+                self.snapshot = None
+        try:
+            data = {
+                "ltp": float(self.latest_ltp),
+                "latest_alma": float(self.alma.value or 0.0),
+                # Bars are tailed from the journal instead of being rewritten here
+                "journal": self.journal.path,
+                "bars": self.bars.total,
+                "retention": self.bars.capacity,
+                "version": "5.0",
+                "last_update": time.time(),
+                "token_id": self.token_id,
+                "exchange_type": self.exchange_type,
+                "bar_type": self.bar_type,
+                "tick_ns": self.last_tick_ns,
+                "publish_ns": now_ns(),
+            }
+            # Save locally with retry logic for Windows file locks
+            target = data_file(self.token_id)
+            temp_file = target + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(data, f)
+            
+            # Use small retry loop for os.replace to handle Windows file locking issues
+            for _ in range(3):
+                try:
+                    os.replace(temp_file, target)
+                    break
+                except PermissionError:
+                    time.sleep(0.1)
+            self.published()
+                
+        except Exception as e:
+            logger.error(f"[{self.token_id}] Data save error: {e}")
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.journal.close()
+        for series in self.extra:
+            series.close()
+
+
+class EventSubscriber:
+    """
+    One control connection that asked for bar events. Events are queued and
+    sent by its own thread, so a slow runner never holds up tick ingestion.
+    """
+
+    def __init__(self, conn, tokens=None, limit=EVENT_QUEUE_LIMIT):
+        self.conn = conn
+        self.tokens = tokens
+        self.limit = limit
+        self.queue = queue.SimpleQueue()
+        self.alive = True
+        threading.Thread(target=self.sender, daemon=True).start()
+
+    def wants(self, token):
+        return self.tokens is None or token in self.tokens
+
+    def put(self, event):
+        if self.queue.qsize() >= self.limit:
+            logger.warning(f"### Bar event subscriber stalled ({self.limit} events queued), dropping it ###")
+            self.close()
+            return
+        self.queue.put(event)
+
+    def sender(self):
+        while self.alive:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                self.conn.send(event)
+            except Exception:
+                break
+        self.alive = False
+
+    def close(self):
+        self.alive = False
+        self.queue.put(None)
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
 class MarketDataBackend:
-    def __init__(self):
+    def __init__(self, token_list=None, warm_sources=WARM_SOURCES):
         self.lock = threading.Lock()
-        self.ohlc_bars = []
-        self.alma_bars = []
-        self.raw_bars = []
-        self.current_bar = {"open": None, "high": -float("inf"), "low": float("inf"), "close": None, "ticks": 0, "volume": 0}
-        self.latest_ltp = 0.0
+        token_list = token_list or DEFAULT_TOKEN_LIST
+        self.warm_sources = warm_sources
+        self.correlation_id = f"backend_{token_list[0]['tokens'][0]}"
+        # One bar builder + indicator + publisher set per subscribed token
+        self.instruments = {}
+        for entry in token_list:
+            for tok in entry["tokens"]:
+                self.instruments[str(tok)] = InstrumentState(tok, entry["exchangeType"], warm_sources)
         self.sws = None
+        self.stop_event = threading.Event()
+        self.control = ControlServer(self.handle_command)
+        # Control connections that asked for bar events
+        self.event_subscribers = []
+        # Tokens subscribed over the control channel whose instruments are still being built
+        self.pending = set()
+        self.gaps = GapTracker()
+        # Raw tick capture (compressed chunks under ticks/<date>/<token>/), written off the feed thread
+        self.ticks = TickRecorder() if TICK_STORE_ENABLED else None
+
+    @property
+    def token_list(self):
+        """Current subscriptions in SmartWebSocketV2 TOKEN_LIST form."""
+        # subscribe/unsubscribe change instruments from control-channel threads
+        with self.lock:
+            instruments = list(self.instruments.items())
+        grouped = {}
+        for tok, state in instruments:
+            grouped.setdefault(state.exchange_type, []).append(tok)
+        return [{"exchangeType": exch, "tokens": tokens} for exch, tokens in grouped.items()]
+
+    # ================= CONTROL CHANNEL =================
+    def handle_command(self, cmd, conn=None):
+        action = cmd.get("cmd")
+        if action == "subscribe":
+            try:
+                exchange_type = int(cmd["exchange_type"])
+            except (KeyError, TypeError, ValueError):
+                exchange_type = None
+            if exchange_type is None or not isinstance(cmd.get("tokens"), (list, tuple)):
+                return {"stat": "Not Ok", "emsg": "subscribe needs exchange_type and tokens"}
+            return self.subscribe(exchange_type, [str(t) for t in cmd["tokens"]])
+        if action == "unsubscribe":
+            if not isinstance(cmd.get("tokens"), (list, tuple)):
+                return {"stat": "Not Ok", "emsg": "unsubscribe needs tokens"}
+            return self.unsubscribe([str(t) for t in cmd["tokens"]])
+        if action == "status":
+            with self.lock:
+                pending = sorted(self.pending)
+            return {"stat": "Ok", "token_list": self.token_list, "pending": pending, "feed": self.gaps.as_dict(),
+                    "latency": latency.summary()}
+        if action == "events":
+            tokens = {str(t) for t in cmd["tokens"]} if cmd.get("tokens") else None
+            with self.lock:
+                self.event_subscribers.append(EventSubscriber(conn, tokens))
+            logger.info(f"### Bar event subscriber added for {sorted(tokens) if tokens else 'all tokens'} ###")
+            return {"stat": "Ok", "token_list": self.token_list}
+        if action == "stop":
+            self.stop_event.set()
+            return {"stat": "Ok"}
+        return {"stat": "Not Ok", "emsg": f"Unknown command: {action}"}
+
+    def subscribe(self, exchange_type, tokens, wait=False):
+        """
+        Start tracking `tokens`. Warm start may fetch candles over the network, so
+        by default the reply comes at once and the tokens are listed as pending
+        until their instruments are built (see status).
+        """
+        with self.lock:
+            todo = [t for t in dict.fromkeys(tokens) if t not in self.instruments and t not in self.pending]
+            self.pending.update(todo)
+        if todo:
+            if wait:
+                self.add_instruments(exchange_type, todo)
+            else:
+                threading.Thread(target=self.add_instruments, args=(exchange_type, todo), daemon=True).start()
+        return {"stat": "Ok", "pending": todo, "token_list": self.token_list}
+
+    def add_instruments(self, exchange_type, tokens):
+        # Built outside the lock so warm start never stalls ticks of other instruments
+        states = []
+        for tok in tokens:
+            try:
+                states.append(InstrumentState(tok, exchange_type, self.warm_sources))
+            except Exception as e:
+                logger.error(f"[{tok}] Subscribe failed: {e}")
+        with self.lock:
+            new = []
+            for state in states:
+                # Unsubscribed while it was being built
+                if state.token_id not in self.pending or state.token_id in self.instruments:
+                    state.close()
+                    continue
+                self.instruments[state.token_id] = state
+                new.append(state.token_id)
+            self.pending.difference_update(tokens)
+        if new:
+            self.send_subscription("subscribe", [{"exchangeType": exchange_type, "tokens": new}])
+        return new
+
+    def unsubscribe(self, tokens):
+        with self.lock:
+            self.pending.difference_update(tokens)
+            removed = [self.instruments.pop(t) for t in tokens if t in self.instruments]
+        if removed:
+            grouped = {}
+            for state in removed:
+                grouped.setdefault(state.exchange_type, []).append(state.token_id)
+            self.send_subscription("unsubscribe", [{"exchangeType": e, "tokens": t} for e, t in grouped.items()])
+            for state in removed:
+                state.close()
+        return {"stat": "Ok", "removed": [s.token_id for s in removed], "token_list": self.token_list}
+
+    def send_subscription(self, action, token_list):
+        # Applied to the live session; if the socket is not up yet on_open picks them up
+        if self.sws is None:
+            return
+        try:
+            getattr(self.sws, action)(self.correlation_id, 3, token_list)
+            logger.info(f"### Live {action} sent for {token_list} ###")
+        except Exception as e:
+            logger.error(f"Live {action} error (applied on next connect): {e}")
+
+    def mark_gap(self, seconds):
+        """Record a feed outage on every instrument; it is stamped on each one's next bar."""
+        with self.lock:
+            for state in self.instruments.values():
+                state.mark_gap(seconds)
 
     def on_open(self, wsapp):
         logger.info("### [v2.0] WebSocket Connected Successfully ###")
+        gap = self.gaps.on_connect()
+        if gap:
+            logger.warning(f"### [v2.0] Feed restored after {gap:.1f}s outage (reconnect #{self.gaps.reconnects}) ###")
+            self.mark_gap(gap)
         try:
             # Small delay to ensure handshake is fully processed by the server
             time.sleep(2)
-            self.sws.subscribe(CORRELATION_ID, 3, TOKEN_LIST)
-            logger.info(f"### [v2.0] Subscription request sent for {TOKEN_LIST} ###")
+            self.sws.subscribe(self.correlation_id, 3, self.token_list)
+            logger.info(f"### [v2.0] Subscription request sent for {self.token_list} ###")
         except Exception as e:
             logger.error(f"Subscription Error: {e}")
 
@@ -61,6 +461,7 @@ class MarketDataBackend:
             self.process_message(message)
 
     def process_message(self, message):
+        recv_ns = now_ns()
         if isinstance(message, dict) and "last_traded_price" in message:
             try:
                 ltp = message["last_traded_price"] / 100
@@ -75,8 +476,9 @@ class MarketDataBackend:
                 else:
                     ts = datetime.now()
                 
-                logger.info(f"Tick received: LTP={ltp}, Qty={qty}, TS={ts}")
-                self.add_tick(ltp, qty, ts)
+                token = message.get("token")
+                logger.debug(f"Tick received: Token={token}, LTP={ltp}, Qty={qty}, TS={ts}")
+                self.add_tick(ltp, qty, ts, token, recv_ns)
             except Exception as e:
                 logger.error(f"Tick processing error: {e}")
                 logger.error(traceback.format_exc())
@@ -92,121 +494,195 @@ class MarketDataBackend:
     def on_close(self, wsapp, code, msg):
         logger.warn(f"### [v2.0] WebSocket Closed: {code} - {msg} ###")
 
-    def add_tick(self, ltp, qty, ts):
+    def add_tick(self, ltp, qty, ts, token=None, recv_ns=None):
         with self.lock:
-            self.latest_ltp = ltp
-            if self.current_bar["open"] is None:
-                self.current_bar["open"] = ltp
-            self.current_bar["high"] = max(self.current_bar["high"], ltp)
-            self.current_bar["low"] = min(self.current_bar["low"], ltp)
-            self.current_bar["close"] = ltp
-            self.current_bar["ticks"] += 1
-            self.current_bar["volume"] += qty
-
-            if self.current_bar["ticks"] >= TICK_BAR_SIZE:
-                # Use raw UTC timestamp for chart consistency
-                chart_time = int(ts.timestamp())
-                bar = {
-                    "time": chart_time,
-                    "open": self.current_bar["open"],
-                    "high": self.current_bar["high"],
-                    "low": self.current_bar["low"],
-                    "close": self.current_bar["close"],
-                    "volume": self.current_bar["volume"]
-                }
-                self.ohlc_bars.append(bar)
-                self.raw_bars.append(bar)
-                
-                # ALMA Logic (Arnaud Legoux Moving Average - 200 period)
-                if len(self.ohlc_bars) >= ALMA_PERIOD:
-                    closes = np.array([b["close"] for b in self.ohlc_bars[-ALMA_PERIOD:]])
-                    offset = 0.85
-                    sigma = 6.0
-                    m = offset * (ALMA_PERIOD - 1)
-                    s = ALMA_PERIOD / sigma
-                    weights = np.exp(-((np.arange(ALMA_PERIOD) - m)**2) / (2 * s**2))
-                    weights /= weights.sum()
-                    alma_val = float(np.dot(closes, weights))
-                    self.alma_bars.append({"time": chart_time, "value": alma_val})
-                else:
-                    # Initializing: use simple mean if < 200
-                    closes = [b["close"] for b in self.ohlc_bars]
-                    alma_val = sum(closes) / len(closes)
-                    self.alma_bars.append({"time": chart_time, "value": alma_val})
-
-                if len(self.ohlc_bars) > 1000: # Increased limit for ALMA 200 support
-                    self.ohlc_bars.pop(0)
-                    if self.alma_bars: self.alma_bars.pop(0)
-                
-                self.current_bar = {"open": None, "high": -float("inf"), "low": float("inf"), "close": None, "ticks": 0, "volume": 0}
-                self.save_data()
+            if token is None and len(self.instruments) == 1:
+                state = next(iter(self.instruments.values()))
+            else:
+                state = self.instruments.get(str(token))
+            if state is None:
+                return
+            if self.ticks is not None:
+                self.ticks.record(state.token_id, state.exchange_type, ltp, qty, int(ts.timestamp() * 1000))
+            closed = state.add_tick(ltp, qty, ts, recv_ns)
+            if closed:
+                # Push to strategy runners first; persistence can follow
+                self.publish_bars(state, closed)
+                state.save_data()
+
+    def publish_bars(self, state, count=1):
+        """Queue the last `count` closed bars for every event subscriber of its token (caller holds the lock)."""
+        if not self.event_subscribers:
+            return
+        first = state.bars.total - count
+        for i, bar in enumerate(state.bars.since(first)):
+            event = {"event": "bar", "token": state.token_id, "bar_type": state.bar_type, "seq": first + i,
+                     "tick_ns": state.last_tick_ns, "bar_ns": state.bar_ns}
+            for name, value in zip(bar.dtype.names, bar.tolist()):
+                event[name] = value
+            self.send_event(state.token_id, event)
+
+    def send_event(self, token, event):
+        # Only queues: the socket writes happen on each subscriber's sender thread
+        for sub in list(self.event_subscribers):
+            if sub.alive and sub.wants(token):
+                sub.put(event)
+            if not sub.alive:
+                self.event_subscribers.remove(sub)
+                logger.info("### Bar event subscriber disconnected ###")
 
     def save_data(self):
-        try:
-            data = {
-                "ltp": float(self.latest_ltp),
-                "ohlc": self.ohlc_bars,
-                "alma": self.alma_bars,
-                "version": "4.0",
-                "last_update": time.time(),
-                "token_id": str(token_id),
-                "exchange_type": int(exchange_type)
-            }
-            # Save locally with retry logic for Windows file locks
-            temp_file = DATA_FILE + ".tmp"
-            with open(temp_file, "w") as f:
-                json.dump(data, f)
-            
-            # Use small retry loop for os.replace to handle Windows file locking issues
-            for _ in range(3):
-                try:
-                    os.replace(temp_file, DATA_FILE)
+        # Heartbeat: also closes time bars on instruments that have gone quiet
+        for state in self.instruments.values():
+            closed = state.poll()
+            if closed:
+                self.publish_bars(state, closed)
+            state.save_data()
+
+    def export_metrics(self):
+        feed = self.gaps.as_dict()
+        latency.export({
+            "feed_connected": feed["connected"],
+            "feed_reconnects": feed["reconnects"],
+            "feed_downtime_seconds": feed["total_downtime"],
+            "feed_last_gap_seconds": feed["last_gap"],
+        })
+
+    def new_socket(self):
+        # Re-read auth.json on every (re)connect so a fresh login from the UI is picked up
+        with open("auth.json", "r") as f:
+            auth = json.load(f)
+        
+        # Using raw token as in original working script
+        token = auth["Authorization"]
+        
+        # No library retries: its fixed 10s sleep-and-reconnect happens inside connect(), hidden from
+        # feed_supervisor, so the outage would never reach GapTracker or the bars. Every drop returns here.
+        sws = SmartWebSocketV2(token, auth["api_key"], auth["client_code"], auth["feedtoken"], max_retry_attempt=0)
+        sws.on_open = self.on_open
+        sws.on_data = self.on_data
+        sws.on_error = self.on_error
+        sws.on_close = self.on_close
+        
+        logger.info(f"### [v2.0] Connecting client {auth['client_code']} ###")
+        return sws
+
+    def feed_supervisor(self):
+        """Keeps the feed up: reconnects with jittered backoff, on_open replays the current subscriptions."""
+        backoff = Backoff()
+        while not self.stop_event.is_set():
+            try:
+                self.sws = self.new_socket()
+                self.sws.connect()  # blocks until the socket closes
+            except Exception as e:
+                logger.error(f"### [v2.0] Feed connection error: {e} ###")
+            if self.stop_event.is_set():
+                break
+
+            uptime = self.gaps.on_disconnect()
+            if uptime >= STABLE_CONNECTION_SECONDS:
+                backoff.reset()
+            delay = backoff.next()
+            logger.warning(f"### [v2.0] Feed down, reconnecting in {delay:.1f}s ###")
+            self.stop_event.wait(delay)
+
+    def replay_feed(self, ticks, tokens, speed=1.0, exit_when_done=False):
+        """
+        Feed recorded ticks through process_message in place of SmartWebSocketV2.
+        `speed` scales the recorded timing (100 = 100x faster); 0 replays as fast as possible.
+        """
+        n = len(ticks)
+        logger.info(f"### [v2.0] Replaying {n} ticks at {'max' if speed <= 0 else f'{speed:g}x'} speed ###")
+        self.gaps.on_connect()
+        ts_ms = ticks["ts_ms"].tolist()
+        ltp = ticks["ltp"].tolist()
+        qty = ticks["qty"].tolist()
+        exch = ticks["exchange_type"].tolist()
+        tokens = tokens.tolist()
+        start = time.monotonic()
+        t0 = ts_ms[0] if n else 0
+        done = 0
+        for i in range(n):
+            if speed > 0:
+                delay = (ts_ms[i] - t0) / 1000 / speed - (time.monotonic() - start)
+                if delay > 0.001 and self.stop_event.wait(delay):
                     break
-                except PermissionError:
-                    time.sleep(0.1)
-            
-            # (Firebase code removed)
-                
-        except Exception as e:
-            logger.error(f"Data save error: {e}")
+            elif self.stop_event.is_set():
+                break
+            # Same shape as SmartWebSocketV2's parsed packets (prices in paise)
+            self.process_message({
+                "token": tokens[i],
+                "exchange_type": exch[i],
+                "last_traded_price": int(round(ltp[i] * 100)),
+                "last_traded_quantity": qty[i],
+                "exchange_timestamp": ts_ms[i],
+            })
+            done += 1
+        elapsed = time.monotonic() - start
+        logger.info(f"### [v2.0] Replay finished: {done} ticks in {elapsed:.2f}s ({done / elapsed if elapsed else 0:.0f} ticks/s) ###")
+        self.gaps.on_disconnect()
+        if exit_when_done:
+            self.stop_event.set()
 
-    def run(self):
+    def run(self, replay=None, speed=1.0, exit_after_replay=False):
+        """Run live, or with `replay=(ticks, tokens)` from tickstore.load_replay instead of the feed."""
         logger.info("### [v2.0] Starting Backend System ###")
         if os.path.exists(STOP_FILE):
             os.remove(STOP_FILE)
             
         try:
-            with open("auth.json", "r") as f:
-                auth = json.load(f)
-            
-            # Using raw token as in original working script
-            token = auth["Authorization"]
-            
-            self.sws = SmartWebSocketV2(token, auth["api_key"], auth["client_code"], auth["feedtoken"])
-            self.sws.on_open = self.on_open
-            self.sws.on_data = self.on_data
-            self.sws.on_error = self.on_error
-            self.sws.on_close = self.on_close
-            
-            logger.info(f"### [v2.0] Connecting client {auth['client_code']} ###")
-            
-            ws_thread = threading.Thread(target=self.sws.connect, daemon=True)
+            if replay is None:
+                ws_thread = threading.Thread(target=self.feed_supervisor, daemon=True)
+            else:
+                ws_thread = threading.Thread(target=self.replay_feed, args=(*replay, speed, exit_after_replay), daemon=True)
             ws_thread.start()
+            self.control.start()
+            if self.ticks is not None:
+                self.ticks.start()
             
             while True:
-                if os.path.exists(STOP_FILE):
+                # Stop arrives over the control channel, or via STOP_FILE as a fallback
+                if self.stop_event.is_set() or os.path.exists(STOP_FILE):
                     logger.info("### [v2.0] Stop signal detected. Shutting down sws... ###")
-                    self.sws.close_connection()
+                    self.stop_event.set()
+                    if self.sws is not None:
+                        self.sws.close_connection()
                     break
                 # Refresh data file every 1 second to keep 'running' state in frontend
-                self.save_data()
-                time.sleep(1)
+                with self.lock:
+                    self.save_data()
+                self.export_metrics()
+                self.stop_event.wait(1)
         except Exception as e:
             logger.error(f"Main loop error: {e}")
             logger.error(traceback.format_exc())
         finally:
+            self.control.close()
+            if self.ticks is not None:
+                self.ticks.close()
+            for state in self.instruments.values():
+                state.close()
             logger.info("### [v2.0] Backend Shutdown Complete ###")
 
 if __name__ == "__main__":
-    backend = MarketDataBackend()
-    backend.run()
+    parser = argparse.ArgumentParser(description="AngelOne tick-bar + ALMA backend")
+    parser.add_argument("tokens", nargs="*", help="exchange_type token[,token...] pairs")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="Replay recorded ticks (ticks/<date>[/<token>], a chunk or a .csv) instead of the live feed")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier, 0 = as fast as possible")
+    parser.add_argument("--exit-after-replay", action="store_true")
+    parser.add_argument("--no-warm-start", action="store_true", help="Start ALMA from empty history")
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay:
+        replay = load_replay(args.replay)
+        token_list = parse_token_list(args.tokens) if args.tokens else replay_token_list(*replay)
+    else:
+        token_list = parse_token_list(args.tokens)
+    # A replay starts cold: its own ticks may already be in the tick store
+    warm_sources = () if args.no_warm_start or replay is not None else WARM_SOURCES
+    backend = MarketDataBackend(token_list, warm_sources)
+    if replay is not None:
+        backend.ticks = None  # never re-record replayed ticks
+    backend.run(replay, args.speed, args.exit_after_replay)
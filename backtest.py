@@ -0,0 +1,188 @@
+import argparse
+import os
+import sys
+import numpy as np
+from indicators import alma_series, ALMA_PERIOD, ALMA_OFFSET, ALMA_SIGMA
+from bars import TICK_BAR_SIZE
+
+# ================= VECTORIZED BACKTEST =================
+# Replays ticks through the same tick-bar aggregation as backend.py and the
+# same WAIT_FOR_DIP/BUY/SELL rules as strategy.AlmaCrossoverStrategy,
+# without a Python loop over bars:
+#
+#   s_k = sign(close_k - alma_k); bars with s_k == 0 change nothing, so they
+#   are dropped. The rest form alternating runs of +1 / -1. After the j-th
+#   run of -1s the machine is armed (BUY) iff
+#       armed_j = (run_j has >= 2 bars) or not armed_(j-1),   armed_(-1) = False
+#   i.e. armed when the distance to the last run of length >= 2 is even.
+#   An armed -1 run is followed by a buy at the next +1 run's first bar and
+#   a sell at the first bar of the -1 run after it.
+#
+# Orders fill at the signal bar's close (the runner sends a market order
+# right after the bar closes).
+
+
+def aggregate_ticks(prices, qty=None, times=None, bar_size=TICK_BAR_SIZE):
+    """
+    Tick bars of `bar_size` ticks, as backend.InstrumentState builds them.
+    Returns a dict of arrays: time, open, high, low, close, volume. A trailing
+    partial bar is dropped (it would not have closed live either).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    n = len(prices) // bar_size
+    p = prices[:n * bar_size].reshape(n, bar_size)
+    bars = {
+        "open": p[:, 0],
+        "high": p.max(axis=1),
+        "low": p.min(axis=1),
+        "close": p[:, -1],
+    }
+    if qty is not None:
+        bars["volume"] = np.asarray(qty, dtype=np.float64)[:n * bar_size].reshape(n, bar_size).sum(axis=1)
+    else:
+        bars["volume"] = np.full(n, float(bar_size))
+    if times is not None:
+        # The closing tick's timestamp, like the live bar
+        bars["time"] = np.asarray(times)[bar_size - 1:n * bar_size:bar_size]
+    return bars
+
+
+def crossover_trades(close, alma):
+    """
+    Bar indices of buys and sells produced by the crossover state machine.
+    Returns (buy_idx, sell_idx); len(buy_idx) - len(sell_idx) is 1 when a
+    position is still open at the end.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    alma = np.asarray(alma, dtype=np.float64)
+    sign = np.sign(close - alma)
+    sign[np.isnan(sign)] = 0
+    idx = np.flatnonzero(sign)
+    if len(idx) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    s = sign[idx]
+
+    # Runs of equal sign in the compressed sequence
+    starts = np.flatnonzero(np.concatenate(([True], s[1:] != s[:-1])))
+    lengths = np.diff(np.append(starts, len(s)))
+    run_sign = s[starts]
+
+    neg = np.flatnonzero(run_sign < 0)  # run numbers of the -1 runs
+    if len(neg) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    j = np.arange(len(neg))
+    long_run = lengths[neg] >= 2
+    # Last reset (long run) at or before j; a virtual reset at -2 encodes armed_(-1) = False
+    last_reset = np.maximum.accumulate(np.where(long_run, j, -2))
+    armed = (j - last_reset) % 2 == 0
+
+    # Buy on the +1 run right after an armed -1 run, sell on the -1 run after that
+    buy_run = neg[armed] + 1
+    buy_run = buy_run[buy_run < len(starts)]
+    sell_run = buy_run + 1
+    sell_run = sell_run[sell_run < len(starts)]
+    return idx[starts[buy_run]], idx[starts[sell_run]]
+
+
+def evaluate(close, buy_idx, sell_idx, qty=1, cost=0.0):
+    """
+    PnL, trade count and max drawdown for a set of fills at bar closes.
+    An open position at the end is marked to the last close. `cost` is
+    charged per order (per side).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    buy_px = close[buy_idx]
+    sell_px = close[sell_idx]
+    open_position = len(buy_idx) > len(sell_idx)
+
+    # Held from a buy bar's close to its sell bar's close
+    pos = np.zeros(n + 1)
+    np.add.at(pos, buy_idx, 1.0)
+    np.add.at(pos, sell_idx, -1.0)
+    pos = np.cumsum(pos)[:n]
+    step = np.zeros(n)
+    step[1:] = pos[:-1] * np.diff(close) * qty
+    fees = np.zeros(n)
+    np.add.at(fees, buy_idx, cost)
+    np.add.at(fees, sell_idx, cost)
+    equity = np.cumsum(step - fees)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity if n else np.zeros(0)
+
+    closed = (sell_px - buy_px[:len(sell_px)]) * qty - 2 * cost
+    return {
+        "pnl": float(equity[-1]) if n else 0.0,
+        "realized_pnl": float(closed.sum()),
+        "trades": int(len(sell_px)),
+        "wins": int((closed > 0).sum()),
+        "open_position": bool(open_position),
+        "max_drawdown": float(drawdown.max()) if n else 0.0,
+        "bars": int(n),
+    }
+
+
+def backtest_bars(close, period=ALMA_PERIOD, offset=ALMA_OFFSET, sigma=ALMA_SIGMA, qty=1, cost=0.0):
+    """Backtest on an existing close series (e.g. journaled bars)."""
+    alma = alma_series(close, period, offset, sigma)
+    buy_idx, sell_idx = crossover_trades(close, alma)
+    result = evaluate(close, buy_idx, sell_idx, qty, cost)
+    result.update({"period": period, "offset": offset, "sigma": sigma})
+    return result
+
+
+def backtest_ticks(prices, bar_size=TICK_BAR_SIZE, period=ALMA_PERIOD, offset=ALMA_OFFSET, sigma=ALMA_SIGMA,
+                   qty=1, cost=0.0):
+    """Aggregate ticks into bars, then backtest."""
+    bars = aggregate_ticks(prices, bar_size=bar_size)
+    result = backtest_bars(bars["close"], period, offset, sigma, qty, cost)
+    result["bar_size"] = bar_size
+    return result
+
+
+def load_prices(path):
+    """
+    Tick prices from a tick store partition directory (ticks/<date>/<token>)
+    or chunk, a .npz with an `ltp` array, or a .csv (`ltp` or `price`
+    column). A bar journal returns its bar closes instead, with
+    is_ticks=False. Returns (prices, is_ticks).
+    """
+    if os.path.isdir(path):
+        from tickstore import load_partition
+        return load_partition(path)["ltp"], True
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        with np.load(path) as data:
+            return data["ltp"].astype(np.float64), True
+    if ext == ".csv":
+        import pandas as pd
+        df = pd.read_csv(path)
+        column = "ltp" if "ltp" in df.columns else "price"
+        return df[column].to_numpy(dtype=np.float64), True
+    if ext == ".journal":
+        from journal import load_journal
+        return load_journal(path)["close"].astype(np.float64), False
+    raise ValueError(f"Unsupported input: {path}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Vectorized ALMA crossover backtest")
+    parser.add_argument("path", help="Tick store partition (ticks/<date>/<token>), .npz/.csv ticks or a bar journal (.journal)")
+    parser.add_argument("--bar-size", type=int, default=TICK_BAR_SIZE)
+    parser.add_argument("--period", type=int, default=ALMA_PERIOD)
+    parser.add_argument("--offset", type=float, default=ALMA_OFFSET)
+    parser.add_argument("--sigma", type=float, default=ALMA_SIGMA)
+    parser.add_argument("--qty", type=int, default=1)
+    parser.add_argument("--cost", type=float, default=0.0, help="Cost per order")
+    args = parser.parse_args(argv)
+
+    prices, is_ticks = load_prices(args.path)
+    if is_ticks:
+        result = backtest_ticks(prices, args.bar_size, args.period, args.offset, args.sigma, args.qty, args.cost)
+    else:
+        result = backtest_bars(prices, args.period, args.offset, args.sigma, args.qty, args.cost)
+    for key, value in result.items():
+        print(f"{key:>14}: {value}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
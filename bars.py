@@ -0,0 +1,279 @@
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+
+# ================= BAR CONFIG =================
+TICK_BAR_SIZE = 5
+# Bar type driving ALMA, the snapshot and the strategy ("kind:size", see make_builder)
+BAR_TYPE = os.environ.get("BAR_TYPE", f"tick:{TICK_BAR_SIZE}")
+# Further bar types built from the same ticks, e.g. "time:60,renko:5" (journaled only)
+EXTRA_BAR_TYPES = [s.strip() for s in os.environ.get("EXTRA_BAR_TYPES", "").split(",") if s.strip()]
+# Bars kept in memory per instrument; bounds memory for all-day sessions
+BAR_RETENTION = int(os.environ.get("BAR_RETENTION", 1000))
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume", "alma", "gap")
+BAR_DTYPE = np.dtype([
+    ("time", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+    ("alma", "f8"),
+    ("gap", "f8"),  # seconds of feed outage immediately before this bar (0 if none)
+])
+
+
+class BarStore:
+    """
+    Fixed-capacity columnar bar store.
+    Backed by a NumPy structured array used as a ring buffer: append and
+    eviction are O(1) and memory is fixed at `capacity` bars. Each bar is
+    written twice (slot i and i + capacity) so the retained window is always
+    one contiguous, zero-copy slice.
+    """
+
+    def __init__(self, capacity=BAR_RETENTION):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=BAR_DTYPE)
+        self._pos = 0
+        self.total = 0  # bars ever appended; doubles as the sequence number of the next bar
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, time, open, high, low, close, volume, alma=np.nan, gap=0.0):
+        row = (time, open, high, low, close, volume, alma, gap)
+        i = self._pos
+        self._data[i] = row
+        self._data[i + self.capacity] = row
+        self._pos = i + 1 if i + 1 < self.capacity else 0
+        self.total += 1
+        return self.total - 1
+
+    def set_last(self, field, value):
+        """Update a column of the most recent bar (e.g. its ALMA once computed)."""
+        i = (self._pos - 1) % self.capacity
+        self._data[field][i] = value
+        self._data[field][i + self.capacity] = value
+
+    def view(self):
+        """Retained bars, oldest first, as a read-only view (no copy)."""
+        if self.total >= self.capacity:
+            v = self._data[self._pos:self._pos + self.capacity]
+        else:
+            v = self._data[:self.total]
+        v = v.view()
+        v.flags.writeable = False
+        return v
+
+    def since(self, seq):
+        """Bars with sequence number >= seq that are still retained."""
+        first = self.total - len(self)
+        start = max(seq, first) - first
+        return self.view()[start:]
+
+    def last(self):
+        return self.view()[-1] if self.total else None
+
+    def clear(self):
+        self._pos = 0
+        self.total = 0
+
+    def ohlc_records(self):
+        """Chart-ready OHLC dicts for the JSON publishers."""
+        return ohlc_records(self.view())
+
+    def alma_records(self):
+        return alma_records(self.view())
+
+
+def ohlc_records(bars):
+    """Convert BAR_DTYPE rows to lightweight-charts candlestick dicts."""
+    return [
+        {"time": t, "open": o, "high": h, "low": l, "close": c, "volume": vol}
+        for t, o, h, l, c, vol in zip(
+            bars["time"].tolist(), bars["open"].tolist(), bars["high"].tolist(),
+            bars["low"].tolist(), bars["close"].tolist(), bars["volume"].tolist(),
+        )
+    ]
+
+
+def alma_records(bars):
+    return [
+        {"time": t, "value": a}
+        for t, a in zip(bars["time"].tolist(), bars["alma"].tolist())
+    ]
+
+
+# ================= BAR BUILDERS =================
+class BarBuilder(ABC):
+    """
+    Accumulates ticks into OHLCV bars. update() returns the bars a tick
+    closed as (time, open, high, low, close, volume) tuples: usually none or
+    one, Renko can emit several bricks at once.
+    """
+
+    kind = None
+
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError(f"{self.kind} bar size must be positive")
+        self.size = size
+        self.reset()
+
+    @property
+    def spec(self):
+        return f"{self.kind}:{self.size:g}"
+
+    def reset(self):
+        self.open = None
+        self.high = -np.inf
+        self.low = np.inf
+        self.close = None
+        self.volume = 0
+        self.ticks = 0
+
+    def _add(self, ltp, qty):
+        if self.open is None:
+            self.open = ltp
+        if ltp > self.high:
+            self.high = ltp
+        if ltp < self.low:
+            self.low = ltp
+        self.close = ltp
+        self.volume += qty
+        self.ticks += 1
+
+    def _emit(self, t):
+        bar = (int(t), self.open, self.high, self.low, self.close, self.volume)
+        self.reset()
+        return bar
+
+    @abstractmethod
+    def update(self, ltp, qty, t):
+        """Add one tick at time `t`; returns the bars it closed."""
+
+    def poll(self, t):
+        """Close bars due by wall-clock time `t` without a tick (time bars only)."""
+        return []
+
+
+class TickBarBuilder(BarBuilder):
+    """Every `size` ticks."""
+
+    kind = "tick"
+
+    def update(self, ltp, qty, t):
+        self._add(ltp, qty)
+        return [self._emit(t)] if self.ticks >= self.size else []
+
+
+class TimeBarBuilder(BarBuilder):
+    """`size`-second bars stamped with their interval start; intervals without ticks produce no bar."""
+
+    kind = "time"
+
+    def reset(self):
+        super().reset()
+        self.bucket = None
+
+    def _bucket(self, t):
+        return t - t % self.size
+
+    def update(self, ltp, qty, t):
+        bucket = self._bucket(t)
+        closed = self.poll(t) if self.bucket is not None and bucket != self.bucket else []
+        if self.bucket is None:
+            self.bucket = bucket
+        self._add(ltp, qty)
+        return closed
+
+    def poll(self, t):
+        if self.bucket is None or self._bucket(t) == self.bucket:
+            return []
+        return [self._emit(self.bucket)]
+
+
+class VolumeBarBuilder(BarBuilder):
+    """Closes once `size` contracts have traded."""
+
+    kind = "volume"
+
+    def update(self, ltp, qty, t):
+        self._add(ltp, qty)
+        return [self._emit(t)] if self.volume >= self.size else []
+
+
+class RangeBarBuilder(BarBuilder):
+    """Closes once high - low spans `size` points."""
+
+    kind = "range"
+
+    def update(self, ltp, qty, t):
+        self._add(ltp, qty)
+        return [self._emit(t)] if self.high - self.low >= self.size else []
+
+
+class RenkoBuilder(BarBuilder):
+    """
+    Fixed `size` bricks. A new brick continues the trend once price moves a
+    brick beyond the last brick's top/bottom, and reverses once it moves a
+    brick beyond the opposite edge (two bricks from the last close).
+    """
+
+    kind = "renko"
+
+    def reset(self):
+        super().reset()
+        if not hasattr(self, "top"):
+            self.top = self.bottom = None
+
+    def update(self, ltp, qty, t):
+        self._add(ltp, qty)
+        if self.top is None:
+            self.top = self.bottom = ltp
+            return []
+        bricks = []
+        volume = self.volume
+        while ltp >= self.top + self.size:
+            bricks.append((int(t), self.top, self.top + self.size, self.top, self.top + self.size, volume))
+            self.bottom, self.top = self.top, self.top + self.size
+            volume = 0
+        while ltp <= self.bottom - self.size:
+            bricks.append((int(t), self.bottom, self.bottom, self.bottom - self.size, self.bottom - self.size, volume))
+            self.top, self.bottom = self.bottom, self.bottom - self.size
+            volume = 0
+        if bricks:
+            self.reset()
+        return bricks
+
+
+BUILDERS = {cls.kind: cls for cls in (TickBarBuilder, TimeBarBuilder, VolumeBarBuilder, RangeBarBuilder, RenkoBuilder)}
+
+
+def make_builder(spec):
+    """Builder for a "kind:size" spec: tick:5, time:60, volume:1000, range:2.5, renko:5."""
+    kind, _, size = spec.partition(":")
+    cls = BUILDERS.get(kind.strip().lower())
+    if cls is None or not size:
+        raise ValueError(f"Bad bar type {spec!r}; expected one of {', '.join(k + ':N' for k in BUILDERS)}")
+    size = float(size)
+    return cls(int(size) if kind in ("tick", "volume") and size.is_integer() else size)
+
+
+class MultiBarBuilder:
+    """Feeds every tick once to several builders; results are indexed like `specs`."""
+
+    def __init__(self, specs):
+        self.builders = [make_builder(s) if isinstance(s, str) else s for s in specs]
+
+    @property
+    def specs(self):
+        return [b.spec for b in self.builders]
+
+    def update(self, ltp, qty, t):
+        return [b.update(ltp, qty, t) for b in self.builders]
+
+    def poll(self, t):
+        return [b.poll(t) for b in self.builders]
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+# ================= HOT-PATH BENCHMARKS =================
+# Drives the real tick handlers with synthetic streams and reports ticks/s,
+# per-call latency percentiles, tracemalloc allocations and bytes written.
+# Runs inside a scratch directory so live data files are never touched.
+#
+#   python bench.py --rates 1000,10000,100000 --out bench.json
+#   python bench.py --baseline bench.json   (exit 1 on regression)
+DEFAULT_RATES = (1000, 10000, 100000)
+DEFAULT_SECONDS = 2.0
+ALLOC_TICKS = 20000  # ticks per tracemalloc pass (kept separate from timing)
+SAVE_CALLS = 2000
+REGRESSION_TOLERANCE = 0.2
+BENCH_TOKEN = "472789"
+
+
+def percentiles(samples_ns):
+    values = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    if not len(values):
+        return {}
+    p50, p90, p99, p999 = np.percentile(values, (50, 90, 99, 99.9))
+    return {"p50_us": round(p50, 2), "p90_us": round(p90, 2), "p99_us": round(p99, 2),
+            "p999_us": round(p999, 2), "max_us": round(float(values.max()), 2)}
+
+
+def io_written():
+    """Bytes passed to write() by this process (Linux /proc), or None."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def dir_bytes(path="."):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def synthetic_prices(n, start=100.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.round(start + np.cumsum(rng.normal(0, 0.05, n)), 2)
+
+
+def paced(n, rate, call):
+    """Call call(i) n times at `rate` per second (0 = flat out); returns per-call latencies and elapsed seconds."""
+    latencies = np.empty(n, dtype=np.int64)
+    interval = 1e9 / rate if rate else 0
+    perf = time.perf_counter_ns
+    start = perf()
+    for i in range(n):
+        if interval:
+            due = start + i * interval
+            while perf() < due:
+                pass
+        t = perf()
+        call(i)
+        latencies[i] = perf() - t
+    return latencies, (perf() - start) / 1e9
+
+
+def measure(name, rate, n, setup, call, teardown=None):
+    """One scenario: timed pass, then an allocation pass on a fresh setup."""
+    state = setup()
+    io_before, disk_before = io_written(), dir_bytes()
+    latencies, elapsed = paced(n, rate, lambda i: call(state, i))
+    if teardown:
+        teardown(state)
+    io_after = io_written()
+    result = {
+        "scenario": name,
+        "target_rate": rate or "max",
+        "ticks": n,
+        "elapsed_s": round(elapsed, 4),
+        "ticks_per_s": round(n / elapsed, 1) if elapsed else None,
+        "latency": percentiles(latencies),
+        "bytes_written": (io_after - io_before) if io_before is not None else None,
+        "disk_bytes_delta": dir_bytes() - disk_before,
+    }
+
+    m = min(n, ALLOC_TICKS)
+    state = setup()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(m):
+        call(state, i)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if teardown:
+        teardown(state)
+    diff = after.compare_to(before, "filename")
+    result["alloc"] = {
+        "calls": m,
+        "net_blocks": sum(s.count_diff for s in diff),
+        "net_bytes": sum(s.size_diff for s in diff),
+        "peak_bytes": peak,
+        "blocks_per_call": round(sum(abs(s.count_diff) for s in diff) / m, 3),
+    }
+    return result
+
+
+# ================= SCENARIOS =================
+def bench_add_tick(rate, seconds):
+    """MarketDataBackend.add_tick: bar aggregation, ALMA, tick capture and per-bar publishing."""
+    from backend import MarketDataBackend
+    from tickstore import TickRecorder
+    n = int(rate * seconds) if rate else 200000
+    prices = synthetic_prices(n).tolist()
+    base = datetime.now()
+
+    def setup():
+        backend = MarketDataBackend([{"exchangeType": 5, "tokens": [BENCH_TOKEN]}], warm_sources=())
+        backend.ticks = TickRecorder()
+        backend.ticks.start()
+        return backend
+
+    def call(backend, i):
+        backend.add_tick(prices[i], 1, base, BENCH_TOKEN)
+
+    def teardown(backend):
+        backend.ticks.close()
+        for state in backend.instruments.values():
+            state.close()
+
+    return measure("backend.add_tick", rate, n, setup, call, teardown)
+
+
+def bench_process_message(rate, seconds):
+    """MarketDataBackend.process_message with SmartAPI-shaped packets (adds parsing on top of add_tick)."""
+    from backend import MarketDataBackend
+    n = int(rate * seconds) if rate else 200000
+    paise = (synthetic_prices(n) * 100).astype(np.int64).tolist()
+    t0 = int(time.time() * 1000)
+
+    def setup():
+        backend = MarketDataBackend([{"exchangeType": 5, "tokens": [BENCH_TOKEN]}], warm_sources=())
+        backend.ticks = None
+        return backend
+
+    def call(backend, i):
+        backend.process_message({"token": BENCH_TOKEN, "last_traded_price": paise[i],
+                                 "last_traded_quantity": 1, "exchange_timestamp": t0 + i})
+
+    def teardown(backend):
+        for state in backend.instruments.values():
+            state.close()
+
+    return measure("backend.process_message", rate, n, setup, call, teardown)
+
+
+def bench_save_data(rate, seconds):
+    """MarketDataBackend.save_data heartbeat with a full bar history."""
+    from backend import MarketDataBackend
+    from bars import BAR_RETENTION, TICK_BAR_SIZE
+    n = SAVE_CALLS
+    prices = synthetic_prices(BAR_RETENTION * TICK_BAR_SIZE).tolist()
+    base = datetime.now()
+
+    def setup():
+        backend = MarketDataBackend([{"exchangeType": 5, "tokens": [BENCH_TOKEN]}], warm_sources=())
+        backend.ticks = None
+        for p in prices:
+            backend.add_tick(p, 1, base, BENCH_TOKEN)
+        return backend
+
+    def call(backend, i):
+        # One new tick between heartbeats, as on a quiet feed
+        backend.add_tick(prices[i % len(prices)], 1, base, BENCH_TOKEN)
+        backend.save_data()
+
+    def teardown(backend):
+        for state in backend.instruments.values():
+            state.close()
+
+    return measure("backend.save_data", 0, n, setup, call, teardown)
+
+
+def bench_indices(rate, seconds):
+    """FlattradeIndicesBackend.on_message with its coalescing writer thread running."""
+    from flattrade_indices import FlattradeIndicesBackend
+    n = int(rate * seconds) if rate else 200000
+    nifty = synthetic_prices(n, 22000.0, seed=1)
+    messages = [json.dumps({"t": "tf", "tk": "26000" if i % 2 else "1", "lp": f"{p:.2f}", "pc": "0.12"})
+                for i, p in enumerate(nifty)]
+
+    def setup():
+        indices = FlattradeIndicesBackend()
+        indices.thread = threading.Thread(target=indices.writer, daemon=True)
+        indices.thread.start()
+        return indices
+
+    def call(indices, i):
+        indices.on_message(None, messages[i])
+
+    def teardown(indices):
+        indices.running = False
+        indices.wake.set()
+        indices.thread.join()
+
+    return measure("flattrade_indices.on_message", rate, n, setup, call, teardown)
+
+
+SCENARIOS = {
+    "add_tick": bench_add_tick,
+    "process_message": bench_process_message,
+    "save_data": bench_save_data,
+    "indices": bench_indices,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Regressions vs a previous run: lower throughput or higher p99 beyond `tolerance`."""
+    old = {(r["scenario"], str(r["target_rate"])): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        prev = old.get((r["scenario"], str(r["target_rate"])))
+        if not prev:
+            continue
+        if r["target_rate"] == "max" and prev.get("ticks_per_s") and r["ticks_per_s"] < prev["ticks_per_s"] * (1 - tolerance):
+            regressions.append(f"{r['scenario']} @max: {r['ticks_per_s']:.0f} ticks/s (was {prev['ticks_per_s']:.0f})")
+        p99, prev_p99 = r["latency"].get("p99_us"), prev["latency"].get("p99_us")
+        if p99 and prev_p99 and p99 > prev_p99 * (1 + tolerance):
+            regressions.append(f"{r['scenario']} @{r['target_rate']}: p99 {p99}us (was {prev_p99}us)")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Tick hot-path benchmarks")
+    parser.add_argument("--rates", default=",".join(map(str, DEFAULT_RATES)),
+                        help="Comma-separated target ticks/s; a flat-out run is always added")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="Duration of each paced run")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--keep-scratch", action="store_true",
+                        help="Keep the scratch directory with the journals, snapshots and ticks written")
+    args = parser.parse_args(argv)
+
+    rates = [int(r) for r in args.rates.split(",") if r] + [0]
+    out_path = os.path.abspath(args.out)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    # Keep per-bar INFO logging out of the measurements
+    os.environ.setdefault("BACKEND_LOG_LEVEL", "WARNING")
+    # Benchmarks write their data files into a scratch directory
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="moon_bench_")
+    os.chdir(scratch)
+    results = []
+    try:
+        for name in args.scenarios.split(","):
+            for rate in ([0] if name == "save_data" else rates):
+                r = SCENARIOS[name](rate, args.seconds)
+                results.append(r)
+                lat = r["latency"]
+                print(f"{r['scenario']:<30} {str(r['target_rate']):>7}/s -> {r['ticks_per_s']:>10.0f} ticks/s  "
+                      f"p50 {lat['p50_us']:>7.1f}us  p99 {lat['p99_us']:>8.1f}us  "
+                      f"{r['alloc']['blocks_per_call']:>6.2f} blocks/call  {r['bytes_written'] or 0:>10} B written")
+    finally:
+        os.chdir(cwd)
+        if not args.keep_scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {"environment": environment(), "results": results}
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out_path}" + (f" (scratch data in {scratch})" if args.keep_scratch else ""))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
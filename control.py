@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+from logzero import logger
+
+# ================= CONTROL CHANNEL =================
+# Local command channel into a running backend.py. Commands and replies are
+# plain dicts, e.g. {"cmd": "subscribe", "exchange_type": 2, "tokens": ["43210"]}
+# -> {"stat": "Ok", ...} / {"stat": "Not Ok", "emsg": "..."}.
+#
+# A handler may keep the connection and push unsolicited messages on it
+# later (e.g. bar events); sends are serialized per connection.
+#
+# Messages are pickled, so only holders of the authkey may connect. Unless
+# BACKEND_CONTROL_KEY is set, the backend generates a random key on every
+# start and writes it to CONTROL_KEY_FILE (mode 0600), where the UI and the
+# strategy runner read it.
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = int(os.environ.get("BACKEND_CONTROL_PORT", 6011))
+CONTROL_KEY_FILE = os.environ.get("BACKEND_CONTROL_KEY_FILE", "control.key")
+CONTROL_AUTHKEY = os.environ.get("BACKEND_CONTROL_KEY", "").encode() or None
+
+
+def write_key(key, path=CONTROL_KEY_FILE):
+    """Store the authkey readable by the current user only."""
+    temp_file = path + ".tmp"
+    try:
+        os.remove(temp_file)
+    except OSError:
+        pass
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(temp_file, path)
+
+
+def read_key(path=CONTROL_KEY_FILE):
+    """The running backend's authkey, or None if it has not published one."""
+    if CONTROL_AUTHKEY:
+        return CONTROL_AUTHKEY
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class _Connection:
+    """Connection wrapper whose send() is safe to call from several threads."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    def send(self, obj):
+        with self._send_lock:
+            self._conn.send(obj)
+
+    def recv(self):
+        return self._conn.recv()
+
+    def close(self):
+        self.closed = True
+        self._conn.close()
+
+
+class ControlServer:
+    """Accepts local connections and dispatches each received command to `handler`."""
+
+    def __init__(self, handler, host=CONTROL_HOST, port=CONTROL_PORT, authkey=CONTROL_AUTHKEY,
+                 key_file=CONTROL_KEY_FILE):
+        self.handler = handler
+        self.address = (host, port)
+        self.authkey = authkey
+        self.key_file = key_file
+        self.listener = None
+
+    def start(self):
+        authkey = self.authkey or secrets.token_hex(32).encode()
+        try:
+            self.listener = Listener(self.address, authkey=authkey)
+        except OSError as e:
+            logger.error(f"Control channel unavailable on {self.address}: {e}")
+            return False
+        # Published only once bound, so a second instance never replaces a live backend's key
+        if not self.authkey:
+            try:
+                write_key(authkey, self.key_file)
+            except OSError as e:
+                logger.error(f"Could not write control key to {self.key_file}: {e}")
+                self.close()
+                return False
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"### Control channel listening on {self.address} ###")
+        return True
+
+    def _accept_loop(self):
+        while self.listener is not None:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                if self.listener is None:
+                    break
+                continue
+            threading.Thread(target=self._serve, args=(_Connection(conn),), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                cmd = conn.recv()
+                try:
+                    reply = self.handler(cmd, conn)
+                except Exception as e:
+                    reply = {"stat": "Not Ok", "emsg": str(e)}
+                if reply is not None:
+                    conn.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+            if not self.authkey:
+                try:
+                    os.remove(self.key_file)
+                except OSError:
+                    pass
+
+
+def connect(host=CONTROL_HOST, port=CONTROL_PORT, authkey=None, key_file=CONTROL_KEY_FILE):
+    """Open a control connection, or None if no backend is listening."""
+    authkey = authkey or read_key(key_file)
+    if authkey is None:
+        return None
+    try:
+        return Client((host, port), authkey=authkey)
+    except (OSError, multiprocessing.AuthenticationError):
+        return None
+
+
+def send_command(cmd, timeout=2.0, **kwargs):
+    """Send one command to the running backend and wait for its reply."""
+    conn = connect(**kwargs)
+    if conn is None:
+        return {"stat": "Not Ok", "emsg": "Backend control channel not reachable"}
+    try:
+        conn.send(cmd)
+        if not conn.poll(timeout):
+            return {"stat": "Not Ok", "emsg": "Backend did not reply in time"}
+        return conn.recv()
+    except (EOFError, OSError) as e:
+        return {"stat": "Not Ok", "emsg": str(e)}
+    finally:
+        conn.close()
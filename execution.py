@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from order import get_order_client, POOL_SIZE
+from latency import get_recorder
+
+# ================= EXECUTION ENGINE =================
+# Orders are sent from a thread pool sharing the pooled OrderClient session,
+# so the legs of a basket go out concurrently instead of back to back.
+#
+#   engine = get_execution_engine()
+#   basket = engine.submit_basket([OrderLeg("NIFTY..C26000", 65, "NFO", "B"),
+#                                  OrderLeg("NIFTY..P26000", 65, "NFO", "B")])
+#   basket.results()  -> [OrderResult, OrderResult]; basket.leg_skew_ms()
+#
+# Every order's submit -> sent -> ack timeline (prefixed by any upstream
+# stages the caller passes, e.g. tick -> bar -> event) is exported to
+# latency_orders.json/.prom.
+HISTORY_SIZE = 200
+
+
+class OrderLeg(NamedTuple):
+    tsym: str
+    qty: int
+    exch: str
+    trantype: str  # 'B' or 'S'
+
+
+class OrderResult(NamedTuple):
+    leg: OrderLeg
+    response: dict
+    submitted_ns: int  # time.monotonic_ns() when queued
+    sent_ns: int       # just before the HTTP request
+    done_ns: int       # response received
+
+    @property
+    def ok(self):
+        return self.response.get("stat") == "Ok"
+
+    @property
+    def latency_ms(self):
+        """HTTP round trip."""
+        return (self.done_ns - self.sent_ns) / 1e6
+
+    @property
+    def queue_ms(self):
+        return (self.sent_ns - self.submitted_ns) / 1e6
+
+
+class BasketExecution:
+    """Futures for the legs of one basket, in submission order."""
+
+    def __init__(self, futures):
+        self.futures = futures
+        self.recorded = False
+
+    def done(self):
+        return all(f.done() for f in self.futures)
+
+    def results(self, timeout=None):
+        return [f.result(timeout) for f in self.futures]
+
+    def ok(self):
+        return self.done() and all(r.ok for r in self.results())
+
+    def leg_skew_ms(self):
+        """Spread between the first and last leg leaving the process."""
+        sent = [r.sent_ns for r in self.results()]
+        return (max(sent) - min(sent)) / 1e6
+
+    def fill_skew_ms(self):
+        """Spread between the first and last leg's response."""
+        done = [r.done_ns for r in self.results()]
+        return (max(done) - min(done)) / 1e6
+
+
+class ExecutionEngine:
+    """Thread-pool order sender; every call returns immediately with a future."""
+
+    def __init__(self, client=None, max_workers=POOL_SIZE):
+        self.client = client or get_order_client()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="order")
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.lock = threading.Lock()
+        self.latency = get_recorder("orders")
+
+    def _send(self, leg, submitted_ns, timeline=None):
+        sent_ns = time.monotonic_ns()
+        try:
+            response = self.client.place_order(leg.tsym, leg.qty, leg.exch, leg.trantype)
+        except Exception as e:
+            response = {"stat": "Not Ok", "emsg": str(e)}
+        result = OrderResult(leg, response, submitted_ns, sent_ns, time.monotonic_ns())
+        with self.lock:
+            self.history.append(result)
+        self.latency.record(
+            f"{leg.tsym}:{leg.trantype}:{sent_ns}",
+            list(timeline or []) + [("submit", submitted_ns), ("sent", sent_ns), ("ack", result.done_ns)],
+        )
+        self.latency.export()
+        return result
+
+    def submit(self, tsym, qty, exch, trantype, timeline=None):
+        """
+        Send one order; returns a Future[OrderResult].
+        timeline: optional upstream [(stage, monotonic_ns), ...] that led to this order.
+        """
+        leg = OrderLeg(tsym, qty, exch, trantype)
+        return self.pool.submit(self._send, leg, time.monotonic_ns(), timeline)
+
+    def submit_basket(self, legs, timeline=None):
+        """Send all legs concurrently; returns a BasketExecution."""
+        legs = [OrderLeg(*leg) for leg in legs]
+        submitted_ns = time.monotonic_ns()
+        futures = [self.pool.submit(self._send, leg, submitted_ns, timeline) for leg in legs]
+        basket = BasketExecution(futures)
+        for f in futures:
+            f.add_done_callback(lambda _: self._basket_done(basket))
+        return basket
+
+    def _basket_done(self, basket):
+        with self.lock:
+            if len(basket.futures) < 2 or not basket.done() or basket.recorded:
+                return
+            basket.recorded = True
+        self.latency.observe("leg_skew", basket.leg_skew_ms())
+        self.latency.export()
+
+    def straddle(self, ce_tsym, pe_tsym, qty, exch, trantype='B'):
+        """CE + PE at the same strike as one basket."""
+        return self.submit_basket([
+            OrderLeg(ce_tsym, qty, exch, trantype),
+            OrderLeg(pe_tsym, qty, exch, trantype),
+        ])
+
+    def recent(self, n=20):
+        with self.lock:
+            return list(self.history)[-n:]
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def get_execution_engine():
+    """Process-wide shared ExecutionEngine."""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = ExecutionEngine()
+        return _default_engine
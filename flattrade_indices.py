@@ -7,6 +7,7 @@ import sys
 import hashlib
 import ssl
 from datetime import datetime
+from reconnect import Backoff, GapTracker, STABLE_CONNECTION_SECONDS
 
 # ================= CONFIG =================
 DATA_FILE = "flattrade_indices.json"
@@ -15,6 +16,9 @@ CREDS_FILE = "credentials.json"
 PID_FILE = "flattrade_indices.pid"
 STOP_FILE = "stop_indices.txt"
 WSS_URL = "wss://piconnect.flattrade.in/NorenWS/"
+FLUSH_INTERVAL = float(os.environ.get("INDICES_FLUSH_INTERVAL", 0.25)) # Max write rate for coalesced updates (seconds)
+SIGNIFICANT_MOVE_PCT = 0.1 # Price moves of at least this % are flushed immediately
+HEARTBEAT_INTERVAL = 10
 
 # Instrument Tokens
 # Nifty 50: NSE|26000
@@ -33,6 +37,13 @@ class FlattradeIndicesBackend:
         self.jkey = None
         self.uid = None
         self.running = True
+        # Coalesced persistence: the WS thread only marks state dirty, the writer thread flushes
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.wake = threading.Event()
+        self.flushed_lp = {}
+        # Feed outage accounting, published alongside prices
+        self.gaps = GapTracker()
 
     def check_singleton(self):
         if os.path.exists(PID_FILE):
@@ -66,11 +77,37 @@ class FlattradeIndicesBackend:
             if os.path.exists(STOP_FILE):
                 print("Stop signal received. Heartbeat stopping.")
                 self.running = False
+                self.wake.set()
                 if self.ws:
                     self.ws.close()
                 break
+            self.mark_dirty()
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    def mark_dirty(self, urgent=False):
+        self.dirty = True
+        if urgent:
+            self.wake.set()
+
+    def writer(self):
+        """Flushes pending updates at most every FLUSH_INTERVAL, or at once for significant moves."""
+        while self.running:
+            self.wake.wait(FLUSH_INTERVAL)
+            self.wake.clear()
+            if self.dirty:
+                self.save_data()
+        # Never lose the final state on shutdown
+        if self.dirty:
             self.save_data()
-            time.sleep(10)
+
+    def is_significant(self, name, lp):
+        try:
+            last = self.flushed_lp.get(name)
+            if last is None:
+                return True
+            return abs(float(lp) - last) / last * 100 >= SIGNIFICANT_MOVE_PCT
+        except (TypeError, ValueError, ZeroDivisionError):
+            return False
 
     def load_auth(self):
         # Try local file first
@@ -127,6 +164,10 @@ class FlattradeIndicesBackend:
             if task == "ck": # Connection Ack
                 if data.get("s") == "OK":
                     print("Login Successful.")
+                    gap = self.gaps.on_connect()
+                    if gap:
+                        print(f"Feed restored after {gap:.1f}s outage (reconnect #{self.gaps.reconnects})")
+                    self.mark_dirty(urgent=True)
                     # Subscribe
                     sub_data = {
                         "t": "t", # Touch/Subscribe
@@ -143,16 +184,20 @@ class FlattradeIndicesBackend:
                 pc = data.get("pc") # Percentage Change
                 
                 if token:
-                    name = self.token_map.get(token)
-                    if name:
-                        if lp: self.prices[name]["lp"] = lp
-                        if pc: self.prices[name]["pc"] = pc
-                        self.save_data()
+                    self.update_price(token, lp, pc)
                         # print(f"Update: {name} = {lp}")
                         
         except Exception as e:
             print(f"Error processing message: {e}")
 
+    def update_price(self, token, lp, pc):
+        name = self.token_map.get(token)
+        if name:
+            with self.lock:
+                if lp: self.prices[name]["lp"] = lp
+                if pc: self.prices[name]["pc"] = pc
+            self.mark_dirty(urgent=bool(lp) and self.is_significant(name, lp))
+
     def on_error(self, ws, error):
         print(f"WebSocket Error: {error}")
 
@@ -161,14 +206,22 @@ class FlattradeIndicesBackend:
 
     def save_data(self):
         try:
-            output = {
-                "prices": self.prices,
-                "last_update": time.time()
-            }
+            with self.lock:
+                self.dirty = False
+                output = json.dumps({
+                    "prices": self.prices,
+                    "feed": self.gaps.as_dict(),
+                    "last_update": time.time()
+                })
+                for name, data in self.prices.items():
+                    try:
+                        self.flushed_lp[name] = float(data["lp"])
+                    except (TypeError, ValueError):
+                        pass
             # Atomic save
             temp_file = DATA_FILE + ".tmp"
             with open(temp_file, "w") as f:
-                json.dump(output, f)
+                f.write(output)
             os.replace(temp_file, DATA_FILE)
         except Exception as e:
             print(f"Save error: {e}")
@@ -184,23 +237,44 @@ class FlattradeIndicesBackend:
         # Start heartbeat thread
         h_thread = threading.Thread(target=self.heartbeat, daemon=True)
         h_thread.start()
+        w_thread = threading.Thread(target=self.writer, daemon=True)
+        w_thread.start()
 
         try:
-            # websocket.enableTrace(True)
-            self.ws = websocket.WebSocketApp(
-                WSS_URL,
-                on_open=self.on_open,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close
-            )
-            
-            print(f"Connecting to {WSS_URL}...")
-            self.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+            # Reconnect supervisor: on_open re-logs in and the "ck" ack replays TOKENS
+            backoff = Backoff()
+            while self.running:
+                # websocket.enableTrace(True)
+                self.ws = websocket.WebSocketApp(
+                    WSS_URL,
+                    on_open=self.on_open,
+                    on_message=self.on_message,
+                    on_error=self.on_error,
+                    on_close=self.on_close
+                )
+                
+                print(f"Connecting to {WSS_URL}...")
+                self.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+                if not self.running:
+                    break
+
+                uptime = self.gaps.on_disconnect()
+                self.mark_dirty(urgent=True)
+                if uptime >= STABLE_CONNECTION_SECONDS:
+                    backoff.reset()
+                delay = backoff.next()
+                print(f"Feed down, reconnecting in {delay:.1f}s...")
+                deadline = time.time() + delay
+                while self.running and time.time() < deadline:
+                    time.sleep(0.2)
+                # Pick up a token refreshed by the UI since the last login
+                self.load_auth()
         except KeyboardInterrupt:
             print("Stopping...")
         finally:
             self.running = False
+            self.wake.set()
+            w_thread.join(timeout=5)
             self.cleanup()
 
 if __name__ == "__main__":
@@ -0,0 +1,415 @@
+import asyncio
+import json
+import os
+import queue
+import ssl
+import sys
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import NamedTuple, Optional
+import websockets
+from logzero import logger
+from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+from reconnect import Backoff, GapTracker, STABLE_CONNECTION_SECONDS
+from backend import MarketDataBackend, parse_token_list, STOP_FILE as BACKEND_STOP_FILE
+from flattrade_indices import (
+    FlattradeIndicesBackend, WSS_URL as FLATTRADE_WSS_URL, TOKENS as INDEX_TOKENS,
+    STOP_FILE as INDICES_STOP_FILE, FLUSH_INTERVAL,
+)
+
+# ================= GATEWAY CONFIG =================
+# One asyncio process hosting the AngelOne SmartAPI feed (tick bars + ALMA)
+# and the Flattrade indices feed, replacing backend.py + flattrade_indices.py.
+#
+#   python gateway.py [exchange_type token[,token...]]...
+AUTH_FILE = "auth.json"
+HEARTBEAT_INTERVAL = 1.0
+
+# Feeds use self-signed chains in some regions; matches the sslopt used by the thread-based clients
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.check_hostname = False
+SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+
+class Tick(NamedTuple):
+    """Normalized tick shared by every feed adapter."""
+    source: str
+    token: str
+    exchange: object
+    ltp: Optional[float]
+    qty: int
+    ts_ms: int
+    pc: Optional[str] = None
+    recv_ns: int = 0
+
+
+# ================= FEED ADAPTERS =================
+class FeedAdapter(ABC):
+    """Base adapter: owns one websocket, reconnects with jittered exponential backoff."""
+
+    name = "feed"
+
+    def __init__(self):
+        self.gateway = None
+        self.ws = None
+        self.loop = None
+        self.gaps = GapTracker()
+
+    @abstractmethod
+    def connect(self):
+        """An async context manager yielding the connected websocket."""
+
+    async def on_connect(self, ws):
+        pass
+
+    @abstractmethod
+    def on_message(self, message):
+        """Handle one frame; runs on the event loop, so it must not block."""
+
+    def on_gap(self, seconds):
+        """Called after a reconnect with the length of the outage."""
+        pass
+
+    async def run(self, gateway):
+        self.gateway = gateway
+        self.loop = asyncio.get_running_loop()
+        backoff = Backoff()
+        while gateway.running:
+            try:
+                async with self.connect() as ws:
+                    self.ws = ws
+                    logger.info(f"### [{self.name}] Connected ###")
+                    await self.on_connect(ws)
+                    gap = self.gaps.on_connect()
+                    if gap:
+                        logger.warning(f"### [{self.name}] Feed restored after {gap:.1f}s outage ###")
+                        self.on_gap(gap)
+                    async for message in ws:
+                        self.on_message(message)
+                logger.warning(f"### [{self.name}] Connection closed ###")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{self.name}] Feed error: {e}")
+            finally:
+                self.ws = None
+
+            if not gateway.running:
+                break
+            if self.gaps.on_disconnect() >= STABLE_CONNECTION_SECONDS:
+                backoff.reset()
+            wait = backoff.next()
+            logger.info(f"[{self.name}] Reconnecting in {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    def send_threadsafe(self, payload):
+        """Queue a frame from another thread (e.g. the control channel)."""
+        if self.ws is None or self.loop is None:
+            return False
+        asyncio.run_coroutine_threadsafe(self.ws.send(payload), self.loop)
+        return True
+
+
+class AngelOneAdapter(FeedAdapter):
+    """SmartAPI v2 binary feed; subscriptions follow the hosted MarketDataBackend's token_list."""
+
+    name = "angelone"
+
+    def __init__(self, auth, backend):
+        super().__init__()
+        self.auth = auth
+        self.backend = backend
+        # Share the backend's tracker so its control-channel status reports this feed
+        self.gaps = backend.gaps
+        # Reuse SmartApi's binary packet parser without opening its socket
+        self.parser = SmartWebSocketV2.__new__(SmartWebSocketV2)
+
+    def on_gap(self, seconds):
+        self.backend.mark_gap(seconds)
+
+    def connect(self):
+        # Re-read credentials on every (re)connect so a fresh login from the UI is picked up
+        try:
+            with open(AUTH_FILE, "r") as f:
+                self.auth = json.load(f)
+        except (OSError, ValueError):
+            pass
+        headers = {
+            "Authorization": self.auth["Authorization"],
+            "x-api-key": self.auth["api_key"],
+            "x-client-code": self.auth["client_code"],
+            "x-feed-token": self.auth["feedtoken"],
+        }
+        return websockets.connect(
+            SmartWebSocketV2.ROOT_URI, additional_headers=headers, ssl=SSL_CONTEXT,
+            ping_interval=SmartWebSocketV2.HEART_BEAT_INTERVAL,
+        )
+
+    def request(self, action, correlation_id, mode, token_list):
+        return json.dumps({
+            "correlationID": correlation_id,
+            "action": action,
+            "params": {"mode": mode, "tokenList": token_list},
+        })
+
+    async def on_connect(self, ws):
+        token_list = self.backend.token_list
+        await ws.send(self.request(SmartWebSocketV2.SUBSCRIBE_ACTION, self.backend.correlation_id, 3, token_list))
+        logger.info(f"### [{self.name}] Subscription request sent for {token_list} ###")
+
+    # Same signatures as SmartWebSocketV2, so MarketDataBackend's control channel works unchanged
+    def subscribe(self, correlation_id, mode, token_list):
+        self.send_threadsafe(self.request(SmartWebSocketV2.SUBSCRIBE_ACTION, correlation_id, mode, token_list))
+
+    def unsubscribe(self, correlation_id, mode, token_list):
+        self.send_threadsafe(self.request(SmartWebSocketV2.UNSUBSCRIBE_ACTION, correlation_id, mode, token_list))
+
+    def on_message(self, message):
+        if not isinstance(message, bytes):
+            if message != "pong":
+                logger.info(f"[{self.name}] Other WS message: {message}")
+            return
+        recv_ns = time.monotonic_ns()
+        data = self.parser._parse_binary_data(message)
+        if "last_traded_price" not in data:
+            return
+        ts_ms = data.get("exchange_timestamp") or int(time.time() * 1000)
+        if ts_ms < 10**12:  # seconds
+            ts_ms *= 1000
+        self.gateway.publish(Tick(
+            self.name, data["token"], data["exchange_type"], data["last_traded_price"] / 100,
+            data.get("last_traded_quantity") or 1, ts_ms, None, recv_ns,
+        ))
+
+
+class FlattradeAdapter(FeedAdapter):
+    """NorenWS JSON feed for the index banner."""
+
+    name = "flattrade"
+
+    def __init__(self, uid, jkey, tokens=INDEX_TOKENS):
+        super().__init__()
+        self.uid = uid
+        self.jkey = jkey
+        self.tokens = tokens
+
+    def connect(self):
+        return websockets.connect(FLATTRADE_WSS_URL, ssl=SSL_CONTEXT)
+
+    async def on_connect(self, ws):
+        await ws.send(json.dumps({
+            "t": "c", "uid": self.uid, "actid": self.uid, "source": "API", "susertoken": self.jkey,
+        }))
+
+    def on_message(self, message):
+        recv_ns = time.monotonic_ns()
+        data = json.loads(message)
+        task = data.get("t")
+        if task == "ck":
+            if data.get("s") == "OK":
+                self.send_threadsafe(json.dumps({"t": "t", "k": "#".join(self.tokens)}))
+                logger.info(f"### [{self.name}] Logged in, subscribed to {self.tokens} ###")
+            else:
+                logger.error(f"[{self.name}] Login Failed: {data.get('emsg')}")
+        elif task in ("tk", "tf") and data.get("tk"):
+            lp = data.get("lp")
+            ft = data.get("ft")
+            self.gateway.publish(Tick(
+                self.name, data["tk"], data.get("e"), float(lp) if lp else None,
+                int(data.get("ltq") or 1), int(ft) * 1000 if ft else int(time.time() * 1000),
+                data.get("pc"), recv_ns,
+            ))
+
+
+# ================= GATEWAY =================
+class TickWorker:
+    """Runs a blocking tick consumer on its own thread, fed in order through a queue."""
+
+    def __init__(self, callback, name="tick-worker"):
+        self.callback = callback
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, tick):
+        self.queue.put(tick)
+
+    def run(self):
+        while True:
+            tick = self.queue.get()
+            if tick is None:
+                break
+            try:
+                self.callback(tick)
+            except Exception as e:
+                logger.error(f"Tick worker error: {e}")
+                logger.error(traceback.format_exc())
+
+    def close(self, timeout=10):
+        """Process the ticks already queued, then stop."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+
+class MarketDataGateway:
+    """Single event loop: feed adapters in, normalized ticks fanned out to in-process consumers."""
+
+    def __init__(self):
+        self.adapters = []
+        self.consumers = []
+        self.periodic = []
+        self.running = True
+        self.adapter_tasks = {}
+
+    def add_adapter(self, adapter):
+        self.adapters.append(adapter)
+
+    def add_consumer(self, callback, source=None):
+        """
+        `callback(tick)` runs on the event loop for every tick (optionally from
+        one source), so it must not block; hand blocking work to a TickWorker.
+        """
+        self.consumers.append((source, callback))
+
+    def add_periodic(self, interval, func):
+        """Run blocking `func` in the default executor every `interval` seconds."""
+        self.periodic.append((interval, func))
+
+    def publish(self, tick):
+        for source, callback in self.consumers:
+            if source is None or source == tick.source:
+                try:
+                    callback(tick)
+                except Exception as e:
+                    logger.error(f"Consumer error: {e}")
+                    logger.error(traceback.format_exc())
+
+    async def _every(self, interval, func):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, func)
+            except Exception as e:
+                logger.error(f"Periodic task error: {e}")
+
+    def stop(self):
+        self.running = False
+        for task in getattr(self, "_tasks", []):
+            task.cancel()
+
+    def stop_adapter(self, adapter):
+        """Disconnect one feed for good; the gateway stops once no feed is left."""
+        task = self.adapter_tasks.pop(adapter, None)
+        if task is None:
+            return
+        task.cancel()
+        logger.info(f"### [{adapter.name}] Feed stopped ###")
+        if not self.adapter_tasks:
+            self.stop()
+
+    async def run(self):
+        self.adapter_tasks = {a: asyncio.create_task(a.run(self)) for a in self.adapters}
+        self._tasks = list(self.adapter_tasks.values())
+        self._tasks += [asyncio.create_task(self._every(i, f)) for i, f in self.periodic]
+        # A cancelled feed must not end the others
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def main(argv):
+    gateway = MarketDataGateway()
+    if os.path.exists(BACKEND_STOP_FILE):
+        os.remove(BACKEND_STOP_FILE)
+
+    # AngelOne: tick bars, ALMA and snapshot/journal publishing per token
+    backend = MarketDataBackend(parse_token_list(argv))
+    # add_tick takes the backend lock and writes journals on bar close, so it stays off the loop
+    bar_worker = TickWorker(
+        lambda tick: backend.add_tick(tick.ltp, tick.qty, datetime.fromtimestamp(tick.ts_ms / 1000), tick.token, tick.recv_ns),
+        name="angelone-bars",
+    )
+    if os.path.exists(AUTH_FILE):
+        with open(AUTH_FILE, "r") as f:
+            auth = json.load(f)
+        angel = AngelOneAdapter(auth, backend)
+        backend.sws = angel  # live subscribe/unsubscribe from the control channel
+        gateway.add_adapter(angel)
+        gateway.add_consumer(bar_worker.put, source=AngelOneAdapter.name)
+        bar_worker.start()
+
+        def backend_heartbeat():
+            with backend.lock:
+                backend.save_data()
+            backend.export_metrics()
+        gateway.add_periodic(HEARTBEAT_INTERVAL, backend_heartbeat)
+        backend.control.start()
+        if backend.ticks is not None:
+            backend.ticks.start()
+    else:
+        logger.warning(f"{AUTH_FILE} not found, AngelOne feed disabled")
+
+    # Flattrade: index banner prices (respects a manual stop from the UI)
+    indices = FlattradeIndicesBackend()
+    flattrade = None
+    if not os.path.exists(INDICES_STOP_FILE) and indices.load_auth():
+        flattrade = FlattradeAdapter(indices.uid, indices.jkey)
+        flattrade.gaps = indices.gaps  # published in flattrade_indices.json
+        gateway.add_adapter(flattrade)
+        gateway.add_consumer(
+            lambda tick: indices.update_price(tick.token, tick.ltp, tick.pc),
+            source=FlattradeAdapter.name,
+        )
+
+        def indices_flush():
+            if indices.running and indices.dirty:
+                indices.save_data()
+
+        def indices_heartbeat():
+            if indices.running:
+                indices.mark_dirty()  # keep last_update fresh
+        gateway.add_periodic(FLUSH_INTERVAL, indices_flush)
+        gateway.add_periodic(10, indices_heartbeat)
+
+    if not gateway.adapters:
+        logger.error("No feeds configured. Exiting.")
+        return
+
+    def watch_stop():
+        if backend.stop_event.is_set() or os.path.exists(BACKEND_STOP_FILE):
+            logger.info("### Stop signal detected. Shutting down gateway... ###")
+            loop.call_soon_threadsafe(gateway.stop)
+        # A manual stop of the live indices from the UI, as flattrade_indices.py honours it
+        if flattrade is not None and indices.running and os.path.exists(INDICES_STOP_FILE):
+            logger.info("### Indices stop signal detected. Stopping Flattrade feed... ###")
+            indices.running = False
+            loop.call_soon_threadsafe(gateway.stop_adapter, flattrade)
+    gateway.add_periodic(HEARTBEAT_INTERVAL, watch_stop)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(gateway.run())
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        gateway.running = False
+        backend.control.close()
+        if bar_worker.thread.is_alive():
+            bar_worker.close()
+        if backend.ticks is not None:
+            backend.ticks.close()
+        for state in backend.instruments.values():
+            state.save_data()
+            state.close()
+        if indices.running and indices.dirty:
+            indices.save_data()
+        loop.close()
+        logger.info("### Gateway Shutdown Complete ###")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,112 @@
+import numpy as np
+
+# ================= ALMA CONFIG =================
+ALMA_PERIOD = 200
+ALMA_OFFSET = 0.85
+ALMA_SIGMA = 6.0
+
+
+def alma_weights(period=ALMA_PERIOD, offset=ALMA_OFFSET, sigma=ALMA_SIGMA):
+    """Normalised Gaussian ALMA weights, oldest close first."""
+    m = offset * (period - 1)
+    s = period / sigma
+    weights = np.exp(-((np.arange(period) - m) ** 2) / (2 * s ** 2))
+    return weights / weights.sum()
+
+
+def alma_series(closes, period=ALMA_PERIOD, offset=ALMA_OFFSET, sigma=ALMA_SIGMA, weights=None):
+    """
+    Vectorised ALMA for a whole close history.
+    Matches AlmaEngine.update bar for bar: a running mean while fewer than
+    `period` closes exist, the weighted ALMA afterwards.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    n = len(closes)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    if weights is None:
+        weights = alma_weights(period, offset, sigma)
+
+    warm = min(n, period - 1)
+    out[:warm] = np.cumsum(closes[:warm]) / np.arange(1, warm + 1)
+    if n >= period:
+        # np.convolve flips the kernel, so reverse it to keep oldest-first weights
+        out[period - 1:] = np.convolve(closes, weights[::-1], mode="valid")
+    return out
+
+
+class AlmaEngine:
+    """
+    Streaming ALMA with precomputed weights.
+    Closes live in a ring buffer written twice (slot i and i + period) so the
+    latest window is always one contiguous slice: each update is a single
+    dot product with no Python-level traversal of the bar history.
+    """
+
+    def __init__(self, period=ALMA_PERIOD, offset=ALMA_OFFSET, sigma=ALMA_SIGMA):
+        self.period = period
+        self.offset = offset
+        self.sigma = sigma
+        self.weights = alma_weights(period, offset, sigma)
+        self.reset()
+
+    def reset(self):
+        self._buf = np.zeros(2 * self.period)
+        self._pos = 0
+        self._sum = 0.0
+        self.count = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def update(self, close):
+        p = self.period
+        i = self._pos
+        self._buf[i] = close
+        self._buf[i + p] = close
+        self._pos = i + 1 if i + 1 < p else 0
+        self.count += 1
+
+        if self.count >= p:
+            self.value = float(np.dot(self._buf[i + 1:i + 1 + p], self.weights))
+        else:
+            # Initializing: use simple mean until a full window exists
+            self._sum += close
+            self.value = self._sum / self.count
+        return self.value
+
+    def backfill(self, closes):
+        """
+        Bulk-load a close history. Returns the ALMA value for every close and
+        leaves the engine in the same state as calling update() on each one.
+        """
+        closes = np.asarray(closes, dtype=np.float64)
+        if len(closes) == 0:
+            return np.empty(0)
+        # While warming up the window holds the full history, afterwards the
+        # last `period` closes, so prepending it keeps the series seamless.
+        history = np.concatenate([self.window(), closes]) if self.count else closes
+        values = alma_series(history, self.period, weights=self.weights)[-len(closes):]
+
+        p = self.period
+        count = self.count + len(closes)
+        tail = history[-p:]
+        k = len(tail)
+        self._buf[:] = 0.0
+        self._buf[:k] = tail
+        self._buf[p:p + k] = tail
+        self._pos = k % p
+        self._sum = float(tail.sum()) if count < p else 0.0
+        self.count = count
+        self.value = float(values[-1])
+        return values
+
+    def window(self):
+        """Closes currently held, oldest first (at most `period` of them)."""
+        p = self.period
+        if self.count >= p:
+            return self._buf[self._pos:self._pos + p].copy()
+        return self._buf[:self.count].copy()
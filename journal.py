@@ -0,0 +1,163 @@
+import json
+import os
+import time
+import numpy as np
+from bars import BAR_DTYPE, BAR_FIELDS, BAR_RETENTION
+
+# ================= JOURNAL FORMAT =================
+# Newline-delimited JSON. The first line is a header identifying the writer
+# session (epoch) and compaction generation; every following line is one bar
+# carrying its sequence number:
+#
+#   {"journal": 1, "epoch": 1718000000.0, "generation": 0, "token_id": "472789", ...}
+#   {"seq": 0, "time": 1718000001, "open": ..., "close": ..., "volume": ..., "alma": ...}
+#
+# Bars are only ever appended. Once the file holds COMPACT_FACTOR x retention
+# bars it is rewritten with just the retained window and a new generation.
+JOURNAL_FILE = "market_data_{token}.journal"
+JOURNAL_VERSION = 2
+COMPACT_FACTOR = 2
+
+
+def journal_path(token_id):
+    return JOURNAL_FILE.format(token=token_id)
+
+
+def _bar_line(seq, row):
+    rec = {"seq": seq}
+    for name, value in zip(BAR_FIELDS, row.tolist()):
+        rec[name] = value
+    return json.dumps(rec, separators=(",", ":")) + "\n"
+
+
+class BarJournal:
+    """Append-only on-disk bar log; cost per write is O(new bars), not O(history)."""
+
+    def __init__(self, path, retention=BAR_RETENTION, token_id="", exchange_type=0, bar_type=""):
+        self.path = path
+        self.retention = retention
+        self.token_id = str(token_id)
+        self.exchange_type = int(exchange_type)
+        self.bar_type = bar_type
+        self.epoch = time.time()
+        self.generation = -1
+        self.written = 0  # sequence number of the next bar to append
+        self.lines = 0
+        self._file = None
+
+    def _header(self, first_seq):
+        return json.dumps({
+            "journal": JOURNAL_VERSION,
+            "epoch": self.epoch,
+            "generation": self.generation,
+            "token_id": self.token_id,
+            "exchange_type": self.exchange_type,
+            "bar_type": self.bar_type,
+            "first_seq": first_seq,
+        }, separators=(",", ":")) + "\n"
+
+    def rewrite(self, store):
+        """Compact: replace the file with a fresh header plus the retained bars."""
+        self.generation += 1
+        bars = store.view()
+        first = store.total - len(bars)
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "w") as f:
+            f.write(self._header(first))
+            f.writelines(_bar_line(first + i, row) for i, row in enumerate(bars))
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        # Small retry loop for Windows file locks held by tailing readers
+        for _ in range(3):
+            try:
+                os.replace(temp_file, self.path)
+                break
+            except PermissionError:
+                time.sleep(0.1)
+        self._file = open(self.path, "a")
+        self.written = store.total
+        self.lines = len(bars)
+
+    def append_from(self, store):
+        """Append every bar in `store` not journaled yet, compacting when due."""
+        if self._file is None:
+            self.rewrite(store)
+            return
+        if store.total == self.written:
+            return
+        if store.total - self.written > len(store) or self.lines >= COMPACT_FACTOR * self.retention:
+            self.rewrite(store)
+            return
+        new = store.since(self.written)
+        first = store.total - len(new)
+        self._file.writelines(_bar_line(first + i, row) for i, row in enumerate(new))
+        self._file.flush()
+        self.written = store.total
+        self.lines += len(new)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JournalReader:
+    """
+    Tails a BarJournal from the last byte offset it has seen.
+    Handles compaction (new generation) without re-delivering or dropping
+    bars, and reports a reset when a new writer session starts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.seen = 0
+        self.epoch = None
+        self.generation = None
+
+    def tail(self):
+        """Returns (header, new_bars, reset) or None if the journal is missing."""
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return None
+        with f:
+            first = f.readline()
+            if not first.endswith(b"\n"):
+                return None
+            header = json.loads(first)
+
+            reset = header["epoch"] != self.epoch
+            if reset:
+                self.seen = 0
+            if reset or header["generation"] != self.generation or self.offset < len(first):
+                self.offset = len(first)
+
+            f.seek(self.offset)
+            chunk = f.read()
+
+        # Only consume complete lines; a partially written bar is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        rows = []
+        for line in chunk[:end].splitlines():
+            rec = json.loads(line)
+            if rec["seq"] < self.seen:
+                continue
+            # Older journals predate some columns (e.g. gap)
+            rows.append(tuple(rec.get(name, 0.0) for name in BAR_FIELDS))
+            self.seen = rec["seq"] + 1
+
+        self.offset += end
+        self.epoch = header["epoch"]
+        self.generation = header["generation"]
+        return header, np.array(rows, dtype=BAR_DTYPE), reset
+
+
+def load_journal(path):
+    """Read a whole journal (e.g. the previous session's) as a BAR_DTYPE array."""
+    result = JournalReader(path).tail()
+    if result is None:
+        return np.empty(0, dtype=BAR_DTYPE)
+    return result[1]
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+# ================= LATENCY INSTRUMENTATION =================
+# Hot-path stages are stamped with time.monotonic_ns() and grouped into a
+# timeline per correlation id (e.g. "472789:1234" for bar seq 1234). Each
+# consecutive pair of stages feeds a histogram named "<from>-><to>", plus
+# "total" for first -> last stage.
+#
+# The monotonic clock is system-wide on Linux, Windows and macOS, so stamps
+# taken in backend.py and in the Streamlit process can be subtracted.
+#
+# Exported as latency_<name>.json and latency_<name>.prom (Prometheus text
+# format, for node_exporter's textfile collector or a plain file scrape).
+LATENCY_FILE = "latency_{name}"
+SAMPLE_WINDOW = 4096  # samples kept per histogram for quantiles
+MAX_OPEN = 1024       # unfinished timelines kept before the oldest is dropped
+RECENT_TIMELINES = 20
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = "moon"
+
+
+def now_ns():
+    return time.monotonic_ns()
+
+
+class Histogram:
+    """Sliding-window latency samples in milliseconds."""
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+        self.sum += ms
+
+    def summary(self):
+        values = np.fromiter(self.samples, dtype=float, count=len(self.samples))
+        out = {"count": self.count, "sum": round(self.sum, 3)}
+        if len(values):
+            for q, v in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                out[f"p{int(q * 100)}"] = round(float(v), 3)
+            out["max"] = round(float(values.max()), 3)
+        return out
+
+
+class LatencyRecorder:
+    """Collects stage timelines for one process/component and exports their histograms."""
+
+    def __init__(self, name, path=None):
+        self.name = name
+        self.path = path or LATENCY_FILE.format(name=name)
+        self.histograms = {}
+        self.open = OrderedDict()
+        self.recent = deque(maxlen=RECENT_TIMELINES)
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def stamp(self, corr_id, stage, t_ns=None):
+        """Add a stage to an in-progress timeline."""
+        t_ns = t_ns or now_ns()
+        with self.lock:
+            stages = self.open.get(corr_id)
+            if stages is None:
+                stages = self.open[corr_id] = []
+                if len(self.open) > MAX_OPEN:
+                    self.open.popitem(last=False)
+            stages.append((stage, t_ns))
+
+    def finish(self, corr_id, stage=None, t_ns=None):
+        """Close a timeline (optionally stamping a final stage) and record it."""
+        if stage is not None:
+            self.stamp(corr_id, stage, t_ns)
+        with self.lock:
+            stages = self.open.pop(corr_id, None)
+        if stages:
+            self.record(corr_id, stages)
+        return stages
+
+    def record(self, corr_id, stages):
+        """Record a complete timeline: [(stage, t_ns), ...] in order. Stages stamped 0 are skipped."""
+        stages = [(s, t) for s, t in stages if t]
+        if len(stages) < 2:
+            return
+        with self.lock:
+            for (a, ta), (b, tb) in zip(stages, stages[1:]):
+                self._observe(f"{a}->{b}", (tb - ta) / 1e6)
+            self._observe("total", (stages[-1][1] - stages[0][1]) / 1e6)
+            t0 = stages[0][1]
+            self.recent.append({
+                "id": corr_id,
+                "stages": {s: round((t - t0) / 1e6, 3) for s, t in stages},
+            })
+
+    def observe(self, metric, ms):
+        with self.lock:
+            self._observe(metric, ms)
+
+    def _observe(self, metric, ms):
+        hist = self.histograms.get(metric)
+        if hist is None:
+            hist = self.histograms[metric] = Histogram()
+        hist.observe(ms)
+        self.dirty = True
+
+    def summary(self):
+        with self.lock:
+            return {metric: hist.summary() for metric, hist in self.histograms.items()}
+
+    def export(self, gauges=None):
+        """Write the JSON and Prometheus files if anything changed (or gauges were given)."""
+        if not self.dirty and not gauges:
+            return
+        with self.lock:
+            self.dirty = False
+            recent = list(self.recent)
+        summary = self.summary()
+        data = {
+            "name": self.name,
+            "updated": time.time(),
+            "histograms_ms": summary,
+            "gauges": gauges or {},
+            "recent": recent,
+        }
+        _write_atomic(self.path + ".json", json.dumps(data, indent=2))
+        _write_atomic(self.path + ".prom", self.prometheus(summary, gauges))
+
+    def prometheus(self, summary=None, gauges=None):
+        summary = self.summary() if summary is None else summary
+        label = f'recorder="{self.name}"'
+        lines = [
+            f"# HELP {METRIC_PREFIX}_latency_ms Hot-path stage latency in milliseconds.",
+            f"# TYPE {METRIC_PREFIX}_latency_ms summary",
+        ]
+        for metric, s in summary.items():
+            labels = f'{label},stage="{metric}"'
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in s:
+                    lines.append(f'{METRIC_PREFIX}_latency_ms{{{labels},quantile="{q}"}} {s[key]}')
+            lines.append(f"{METRIC_PREFIX}_latency_ms_sum{{{labels}}} {s['sum']}")
+            lines.append(f"{METRIC_PREFIX}_latency_ms_count{{{labels}}} {s['count']}")
+        for key, value in (gauges or {}).items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{key} gauge")
+                lines.append(f"{METRIC_PREFIX}_{key}{{{label}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as f:
+        f.write(text)
+    # Small retry loop for Windows file locks held by scrapers
+    for _ in range(3):
+        try:
+            os.replace(temp_file, path)
+            break
+        except PermissionError:
+            time.sleep(0.1)
+
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder(name):
+    """Process-wide LatencyRecorder per component name."""
+    with _recorders_lock:
+        recorder = _recorders.get(name)
+        if recorder is None:
+            recorder = _recorders[name] = LatencyRecorder(name)
+        return recorder
+
+
+def load_metrics(name):
+    """Read an exported latency_<name>.json, or None."""
+    try:
+        with open(LATENCY_FILE.format(name=name) + ".json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,6 +1,157 @@
 import requests
 import json
 import os
+import threading
+import time
+from requests.adapters import HTTPAdapter
+
+# ================= ORDER CLIENT CONFIG =================
+BASE_URL = "https://piconnect.flattrade.in"
+PLACE_ORDER_URL = BASE_URL + "/PiConnectTP/PlaceOrder"
+AUTH_FILE = "flattrade_auth.json"
+CREDENTIALS_FILE = "credentials.json"
+# (connect, read) timeouts in seconds
+CONNECT_TIMEOUT = float(os.environ.get("ORDER_CONNECT_TIMEOUT", 3.0))
+READ_TIMEOUT = float(os.environ.get("ORDER_READ_TIMEOUT", 10.0))
+# Keep-alive connections held open to the order endpoint
+POOL_SIZE = int(os.environ.get("ORDER_POOL_SIZE", 4))
+# Re-warm the pool if it has been idle this long (servers drop idle keep-alives)
+KEEPALIVE_INTERVAL = float(os.environ.get("ORDER_KEEPALIVE_INTERVAL", 30.0))
+
+
+class _FileCache:
+    """Parsed JSON file, re-read only when its mtime changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.data = None
+
+    def get(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.mtime, self.data = None, None
+            return None
+        if mtime != self.mtime:
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+            self.mtime = mtime
+        return self.data
+
+
+class OrderClient:
+    """
+    Reusable Flattrade order client.
+    Holds a keep-alive connection pool so orders skip the DNS/TCP/TLS
+    handshake, and caches credentials until their files change on disk.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # No automatic retries: a retried market order could fill twice
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/x-www-form-urlencoded"})
+        self.auth_cache = _FileCache(AUTH_FILE)
+        self.creds_cache = _FileCache(CREDENTIALS_FILE)
+        self.last_used = 0.0
+        self._warming = False
+
+    def credentials(self):
+        """Returns (uid, jkey, error)."""
+        try:
+            auth_data = self.auth_cache.get()
+            jkey = auth_data.get('token') if auth_data else None
+            if not jkey:
+                return None, None, f"Token not found in {AUTH_FILE}"
+
+            # Try environment variable first, then credentials.json
+            uid = os.environ.get('FT_USERNAME')
+            if not uid:
+                creds = self.creds_cache.get()
+                uid = creds.get('username') if creds else None
+            if not uid:
+                return None, None, f"User ID (FT_USERNAME) not found in environment or {CREDENTIALS_FILE}"
+        except Exception as e:
+            return None, None, f"Auth error: {str(e)}"
+        return uid, jkey, None
+
+    def warm(self):
+        """Open (or refresh) a pooled connection to the order host ahead of the first order."""
+        try:
+            self.session.head(BASE_URL, timeout=self.timeout)
+            self.last_used = time.monotonic()
+            return True
+        except requests.RequestException:
+            return False
+        finally:
+            self._warming = False
+
+    def keep_warm(self):
+        """Cheap to call often: re-warms in the background once the pool has been idle too long."""
+        if self._warming or time.monotonic() - self.last_used < KEEPALIVE_INTERVAL:
+            return
+        self._warming = True
+        threading.Thread(target=self.warm, daemon=True).start()
+
+    def place_order(self, tsym, qty, exch, trantype):
+        uid, jkey, error = self.credentials()
+        if error:
+            return {"stat": "Not Ok", "emsg": error}
+
+        order_data = {
+            "uid": uid,
+            "actid": uid,
+            "exch": exch,
+            "tsym": tsym,
+            "qty": str(qty),       # NorenAPI requires all parameters to be strings
+            "prd": "M",            # Margin/Intraday
+            "trantype": trantype,  # 'B' or 'S'
+            "prctyp": "MKT",       # Market
+            "prc": "0",
+            "blprc": "0",
+            "ret": "DAY",
+            "amo": "NO",
+            "ordersource": "API",
+            "remarks": "OrderPortal"
+        }
+
+        # Construct the body as a raw string exactly as expected by many NorenAPI implementations
+        jdata_compact = json.dumps(order_data, separators=(",", ":"))
+        body = f"jData={jdata_compact}&jKey={jkey}"
+
+        try:
+            # Some NorenAPI servers prefer the body string directly without further URL encoding by requests
+            response = self.session.post(PLACE_ORDER_URL, data=body, timeout=self.timeout)
+            self.last_used = time.monotonic()
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {
+                    "stat": "Not Ok",
+                    "emsg": f"HTTP {response.status_code}: {response.text[:100]}"
+                }
+        except Exception as e:
+            return {"stat": "Not Ok", "emsg": str(e)}
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_order_client():
+    """Process-wide shared OrderClient."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OrderClient()
+        return _default_client
+
 
 def place_flattrade_order(tsym, qty, exch, trantype):
     """
@@ -10,72 +161,10 @@ def place_flattrade_order(tsym, qty, exch, trantype):
     exch: Exchange
     trantype: 'B' for Buy, 'S' for Sell
     """
-    url = "https://piconnect.flattrade.in/PiConnectTP/PlaceOrder"
-
-    # Load jkey and credentials
-    try:
-        with open('flattrade_auth.json', 'r') as f:
-            auth_data = json.load(f)
-            jkey = auth_data.get('token')
-            if not jkey:
-                return {"stat": "Not Ok", "emsg": "Token not found in flattrade_auth.json"}
-        
-        # Try environment variable first
-        uid = os.environ.get('FT_USERNAME')
-        
-        if not uid:
-            # Fallback to credentials.json
-            if os.path.exists('credentials.json'):
-                with open('credentials.json', 'r') as f:
-                    creds = json.load(f)
-                    uid = creds.get('username')
-            
-        if not uid:
-            return {"stat": "Not Ok", "emsg": "User ID (FT_USERNAME) not found in environment or credentials.json"}
-    except Exception as e:
-        return {"stat": "Not Ok", "emsg": f"Auth error: {str(e)}"}
-
-    order_data = {
-        "uid": uid,
-        "actid": uid,
-        "exch": exch,
-        "tsym": tsym,
-        "qty": str(qty),       # NorenAPI requires all parameters to be strings
-        "prd": "M",            # Margin/Intraday
-        "trantype": trantype,  # 'B' or 'S'
-        "prctyp": "MKT",       # Market
-        "prc": "0",
-        "blprc": "0",
-        "ret": "DAY",
-        "amo": "NO",
-        "ordersource": "API",
-        "remarks": "OrderPortal"
-    }
-
-    # Construct the body as a raw string exactly as expected by many NorenAPI implementations
-    jdata_compact = json.dumps(order_data, separators=(",", ":"))
-    body = f"jData={jdata_compact}&jKey={jkey}"
-
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-
-    try:
-        # Some NorenAPI servers prefer the body string directly without further URL encoding by requests
-        response = requests.post(url, data=body, headers=headers)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {
-                "stat": "Not Ok", 
-                "emsg": f"HTTP {response.status_code}: {response.text[:100]}"
-            }
-    except Exception as e:
-        return {"stat": "Not Ok", "emsg": str(e)}
+    return get_order_client().place_order(tsym, qty, exch, trantype)
 
 if __name__ == "__main__":
     # Test order
     print("Testing order placement...")
     # res = place_flattrade_order("NIFTY24FEB26C26000", "65", "NFO", "S")
     # print(res)
-
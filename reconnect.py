@@ -0,0 +1,75 @@
+import random
+import time
+
+# ================= RECONNECT POLICY =================
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+# A connection that stayed up this long resets the backoff
+STABLE_CONNECTION_SECONDS = 30.0
+
+
+class Backoff:
+    """Jittered exponential backoff: each delay is drawn from [d/2, d] with d doubling up to `maximum`."""
+
+    def __init__(self, base=RECONNECT_BASE_DELAY, maximum=RECONNECT_MAX_DELAY, factor=2.0):
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.attempt = 0
+
+    def next(self):
+        delay = min(self.base * self.factor ** self.attempt, self.maximum)
+        self.attempt += 1
+        return delay * random.uniform(0.5, 1.0)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class GapTracker:
+    """Feed outage accounting: connection state, reconnect count and downtime."""
+
+    def __init__(self):
+        self.connected = False
+        self.connected_at = None
+        self.disconnected_at = None
+        self.reconnects = 0
+        self.total_downtime = 0.0
+        self.last_gap = 0.0
+
+    def on_connect(self):
+        """Mark the feed up; returns the outage length in seconds (0 on first connect)."""
+        now = time.time()
+        gap = 0.0
+        if self.disconnected_at is not None:
+            gap = now - self.disconnected_at
+            self.reconnects += 1
+            self.total_downtime += gap
+            self.last_gap = gap
+            self.disconnected_at = None
+        self.connected = True
+        self.connected_at = now
+        return gap
+
+    def on_disconnect(self):
+        """Mark the feed down; returns how long the connection had been up."""
+        now = time.time()
+        uptime = now - self.connected_at if self.connected_at else 0.0
+        if self.disconnected_at is None:
+            self.disconnected_at = now
+        self.connected = False
+        self.connected_at = None
+        return uptime
+
+    def as_dict(self):
+        downtime = self.total_downtime
+        if self.disconnected_at is not None:
+            # Include the outage still in progress
+            downtime += time.time() - self.disconnected_at
+        return {
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "total_downtime": round(downtime, 3),
+            "last_gap": round(self.last_gap, 3),
+            "disconnected_at": self.disconnected_at,
+        }
@@ -0,0 +1,730 @@
+import codecs
+import json
+import os
+import shutil
+import threading
+import time
+from array import array
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import requests
+from logzero import logger
+
+# ================= SCRIP MASTER CACHE =================
+# OpenAPIScripMaster.json (~30 MB, ~150k dicts) is converted once into one
+# .npy file per column, which later loads memory-mapped in milliseconds.
+# Each download goes into a new version directory; CURRENT names the live
+# one and is swapped atomically, so readers never see a half-written cache:
+#
+#   scrip_master/CURRENT                    e.g. "v1771234567890"
+#   scrip_master/v.../meta.json             rows, categories, etag/last_modified, checked time
+#   scrip_master/v.../token.npy             U  (fixed-width strings)
+#   scrip_master/v.../symbol.npy            U
+#   scrip_master/v.../name.npy              i4 codes into meta["categories"]["name"]
+#   scrip_master/v.../exch_seg.npy          i1 codes
+#   scrip_master/v.../instrumenttype.npy, expiry.npy   codes
+#   scrip_master/v.../expiry_date.npy       datetime64[D], NaT when the contract has no expiry
+#   scrip_master/v.../strike.npy            f8 rupees (the JSON holds paise), NaN when not an option
+#   scrip_master/v.../lotsize.npy           i4
+#   scrip_master/v.../tick_size.npy         f8 rupees
+#
+# SCRIP_MASTER_URL can point at a local stand-in for testing, e.g.
+#   python -m http.server 8000   and   SCRIP_MASTER_URL=http://127.0.0.1:8000/OpenAPIScripMaster.json
+SCRIP_MASTER_URL = os.environ.get(
+    "SCRIP_MASTER_URL", "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json")
+SCRIP_CACHE_DIR = "scrip_master"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2  # the previous version may still be mapped by another process
+LEGACY_JSON_CACHE = "scrip_master.json"  # raw JSON cache of earlier versions, converted if found
+SCRIP_MAX_AGE = 86400  # check for a new file once a day
+CHECK_INTERVAL = float(os.environ.get("SCRIP_CHECK_INTERVAL", 600))  # refresher wake-up period
+RETRY_INTERVAL = 300  # after a failed refresh
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, per-read) seconds
+CHUNK_SIZE = 1 << 16
+CACHE_VERSION = 2
+
+STRING_COLUMNS = ("token", "symbol")
+CATEGORY_COLUMNS = {"name": np.int32, "exch_seg": np.int8, "instrumenttype": np.int16, "expiry": np.int16}
+NUMERIC_COLUMNS = ("strike", "lotsize", "tick_size")
+COLUMNS = ("token", "symbol", "name", "expiry", "expiry_date", "strike", "lotsize", "instrumenttype",
+           "exch_seg", "tick_size")
+
+# Per-process state: the mapped columns plus whatever was derived from them (frame, chain index)
+_loaded = None
+_derived = {}
+_lock = threading.Lock()
+_refreshers = {}
+
+
+def _parse_expiry(value):
+    try:
+        return np.datetime64(datetime.strptime(value, "%d%b%Y").date(), "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+class RawColumns:
+    """
+    Column values collected record by record in compact form (category codes,
+    float arrays), so neither a list of 150k dicts nor 1M+ small Python
+    objects are ever held.
+    """
+
+    def __init__(self):
+        self.strings = {name: [] for name in STRING_COLUMNS}
+        self.codes = {name: array("q") for name in CATEGORY_COLUMNS}
+        self.lookup = {name: {} for name in CATEGORY_COLUMNS}
+        self.numbers = {name: array("d") for name in NUMERIC_COLUMNS}
+        self.rows = 0
+
+    def add(self, record):
+        for name, values in self.strings.items():
+            values.append(str(record.get(name) or "").strip())
+        for name, codes in self.codes.items():
+            lookup = self.lookup[name]
+            value = str(record.get(name) or "").strip().upper()
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes.append(code)
+        for name, numbers in self.numbers.items():
+            try:
+                numbers.append(float(record.get(name)))
+            except (TypeError, ValueError):
+                numbers.append(np.nan)
+        self.rows += 1
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+
+def to_columns(raw):
+    """RawColumns (or a list of record dicts) -> (columns dict, categories dict)."""
+    if not isinstance(raw, RawColumns):
+        raw = RawColumns().extend(raw)
+    columns, categories = {}, {}
+    for name, values in raw.strings.items():
+        columns[name] = np.array(values, dtype=str)
+    for name, dtype in CATEGORY_COLUMNS.items():
+        # Categories sorted, codes remapped to match
+        values = list(raw.lookup[name])
+        order = np.argsort(np.array(values, dtype=object)) if values else np.empty(0, dtype=np.intp)
+        remap = np.empty(len(values), dtype=np.int64)
+        remap[order] = np.arange(len(values))
+        columns[name] = remap[np.frombuffer(raw.codes[name], dtype=np.int64)].astype(dtype) if values else \
+            np.empty(0, dtype=dtype)
+        categories[name] = [values[i] for i in order]
+
+    # Expiries repeat heavily: parse each distinct value once
+    expiry_dates = np.array([_parse_expiry(e) for e in categories["expiry"]], dtype="datetime64[D]")
+    columns["expiry_date"] = expiry_dates[columns["expiry"]] if len(expiry_dates) else \
+        np.full(raw.rows, np.datetime64("NaT", "D"))
+    strike = np.frombuffer(raw.numbers["strike"], dtype=np.float64) / 100.0
+    strike[strike <= 0] = np.nan
+    columns["strike"] = strike
+    lotsize = np.frombuffer(raw.numbers["lotsize"], dtype=np.float64)
+    columns["lotsize"] = np.nan_to_num(lotsize, nan=0.0).astype(np.int32)
+    columns["tick_size"] = np.frombuffer(raw.numbers["tick_size"], dtype=np.float64) / 100.0
+    return columns, categories
+
+
+def _write_json(path, data):
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(data, f)
+    # Small retry loop for Windows file locks held by readers
+    for _ in range(3):
+        try:
+            os.replace(temp_file, path)
+            break
+        except PermissionError:
+            time.sleep(0.1)
+
+
+def current_dir(folder=SCRIP_CACHE_DIR):
+    try:
+        with open(os.path.join(folder, CURRENT_FILE), "r") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(folder, name) if name else None
+
+
+def write_cache(raw, folder=SCRIP_CACHE_DIR, **source):
+    """
+    Convert records into a new version directory and make it current.
+    `source` (etag, last_modified, checked) is stored in its meta.
+    """
+    columns, categories = to_columns(raw)
+    version = f"v{int(time.time() * 1000)}"
+    target = os.path.join(folder, version)
+    temp_dir = target + ".tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(temp_dir, f"{name}.npy"), values)
+    meta = {
+        "version": CACHE_VERSION,
+        "dir": version,
+        "rows": len(columns["token"]),
+        "categories": categories,
+        "etag": source.get("etag"),
+        "last_modified": source.get("last_modified"),
+        "checked": source.get("checked") or time.time(),
+        "written": time.time(),
+    }
+    _write_json(os.path.join(temp_dir, "meta.json"), meta)
+    os.replace(temp_dir, target)
+
+    # The swap: one small file replaced atomically
+    temp_file = os.path.join(folder, CURRENT_FILE + ".tmp")
+    with open(temp_file, "w") as f:
+        f.write(version)
+    for _ in range(3):
+        try:
+            os.replace(temp_file, os.path.join(folder, CURRENT_FILE))
+            break
+        except PermissionError:
+            time.sleep(0.1)
+    prune_versions(folder)
+    return meta
+
+
+def prune_versions(folder=SCRIP_CACHE_DIR, keep=KEEP_VERSIONS):
+    versions = sorted(d for d in os.listdir(folder) if d.startswith("v") and not d.endswith(".tmp")
+                      and os.path.isdir(os.path.join(folder, d)))
+    for name in versions[:-keep]:
+        # Fails on Windows while another process still maps it; retried after the next download
+        shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+
+def read_meta(folder=SCRIP_CACHE_DIR):
+    path = current_dir(folder)
+    if path is None:
+        return None
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def mark_checked(meta, folder=SCRIP_CACHE_DIR):
+    """Record that the server confirmed the current version is still up to date."""
+    meta = dict(meta, checked=time.time())
+    _write_json(os.path.join(folder, meta["dir"], "meta.json"), meta)
+    return meta
+
+
+def load_columns(folder=SCRIP_CACHE_DIR):
+    """(columns, meta) with every column memory-mapped, or None if there is no usable cache."""
+    meta = read_meta(folder)
+    if meta is None:
+        return None
+    path = os.path.join(folder, meta["dir"])
+    columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+    return columns, meta
+
+
+def build_frame(columns, meta):
+    """DataFrame with categorical name/exch_seg/instrumenttype/expiry and parsed strike/expiry_date."""
+    data = {}
+    for name in COLUMNS:
+        values = columns[name]
+        if name in CATEGORY_COLUMNS:
+            data[name] = pd.Categorical.from_codes(np.asarray(values), meta["categories"][name])
+        else:
+            data[name] = np.asarray(values)
+    return pd.DataFrame(data, columns=list(COLUMNS))
+
+
+def is_stale(meta, max_age=SCRIP_MAX_AGE):
+    return meta is None or time.time() - meta["checked"] > max_age
+
+
+# ================= DOWNLOAD & REFRESH =================
+def iter_json_array(chunks):
+    """
+    Objects of a top-level JSON array, decoded incrementally from byte chunks:
+    only the unparsed tail of the stream is ever held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, started = "", 0, False
+    for chunk in chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        n = len(buf)
+        while True:
+            while pos < n and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= n:
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Scrip master is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # object continues in the next chunk
+            yield obj
+    raise ValueError("Scrip master download ended mid-array")
+
+
+def refresh(folder=SCRIP_CACHE_DIR, url=SCRIP_MASTER_URL, meta=None, progress=None):
+    """
+    Conditional, streamed download. Returns (meta, changed): a 304 only
+    marks the current version as checked, a 200 is parsed while streaming
+    and becomes the new current version.
+    """
+    os.makedirs(folder, exist_ok=True)
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    with requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304 and meta is not None:
+            return mark_checked(meta, folder), False
+        response.raise_for_status()
+        raw = RawColumns()
+        received = [0]
+
+        def chunks():
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received[0] += len(chunk)
+                if progress is not None:
+                    progress["bytes"], progress["rows"] = received[0], raw.rows
+                yield chunk
+
+        for record in iter_json_array(chunks()):
+            raw.add(record)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+    meta = write_cache(raw, folder, etag=etag, last_modified=last_modified)
+    logger.info(f"Scrip master updated: {meta['rows']} instruments, {received[0] / 1e6:.1f} MB")
+    return meta, True
+
+
+def convert_legacy(folder=SCRIP_CACHE_DIR, path=LEGACY_JSON_CACHE):
+    """One-off conversion of a raw JSON cache left by earlier versions."""
+    with open(path, "rb") as f:
+        raw = RawColumns().extend(iter_json_array(iter(lambda: f.read(CHUNK_SIZE), b"")))
+    os.makedirs(folder, exist_ok=True)
+    return write_cache(raw, folder, checked=os.path.getmtime(path))
+
+
+class ScripMasterRefresher:
+    """
+    Background thread keeping the cache fresh. Readers never wait on it:
+    they keep using the current version until a new one is swapped in.
+    """
+
+    def __init__(self, folder=SCRIP_CACHE_DIR, url=SCRIP_MASTER_URL, max_age=SCRIP_MAX_AGE):
+        self.folder = folder
+        self.url = url
+        self.max_age = max_age
+        self.wake = threading.Event()
+        self.force = False
+        self.status = {"state": "idle", "bytes": 0, "rows": 0, "error": None, "last_run": None}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def request(self):
+        """Check the server now instead of waiting for the next cycle."""
+        self.force = True
+        self.wake.set()
+
+    def run(self):
+        while True:
+            delay = CHECK_INTERVAL
+            try:
+                self.refresh_if_due()
+            except Exception as e:
+                logger.error(f"Scrip master refresh failed: {e}")
+                self.status.update(state="failed", error=str(e))
+                delay = RETRY_INTERVAL
+            self.wake.wait(delay)
+            self.wake.clear()
+
+    def refresh_if_due(self):
+        meta = read_meta(self.folder)
+        if meta is None and os.path.exists(LEGACY_JSON_CACHE):
+            self.status.update(state="converting")
+            meta = convert_legacy(self.folder)
+            self.status.update(state="converted")
+        if not (self.force or is_stale(meta, self.max_age)):
+            return
+        self.force = False
+        self.status.update(state="downloading", bytes=0, rows=0, error=None)
+        meta, changed = refresh(self.folder, self.url, meta, self.status)
+        self.status.update(state="updated" if changed else "not modified", last_run=time.time())
+
+
+def get_refresher(folder=SCRIP_CACHE_DIR, max_age=SCRIP_MAX_AGE):
+    """The process's refresher for `folder`, started on first use."""
+    refresher = _refreshers.get(folder)
+    if refresher is None:
+        refresher = _refreshers[folder] = ScripMasterRefresher(folder, SCRIP_MASTER_URL, max_age).start()
+    return refresher
+
+
+def _current(folder, max_age):
+    """(columns, meta) of the current version; derived objects are dropped when it changes. Caller holds _lock."""
+    global _loaded
+    get_refresher(folder, max_age)
+    meta = read_meta(folder)
+    if meta is None:
+        return _loaded
+    if _loaded is None or _loaded[1]["written"] != meta["written"]:
+        loaded = load_columns(folder)
+        if loaded is not None:
+            _loaded = loaded
+            _derived.clear()
+    return _loaded
+
+
+def _get(kind, build, folder, max_age):
+    with _lock:
+        loaded = _current(folder, max_age)
+        if loaded is None:
+            return None
+        if kind not in _derived:
+            _derived[kind] = build(*loaded)
+        return _derived[kind]
+
+
+def get_scrip_master(folder=SCRIP_CACHE_DIR, max_age=SCRIP_MAX_AGE):
+    """
+    The scrip master as a DataFrame, built once per process and rebuilt only
+    when a new version is swapped in. None until the first download finishes.
+    """
+    return _get("frame", build_frame, folder, max_age)
+
+
+def get_option_chain(folder=SCRIP_CACHE_DIR, max_age=SCRIP_MAX_AGE):
+    """The OptionChainIndex for the current cache, built once per process."""
+    return _get("chain", OptionChainIndex, folder, max_age)
+
+
+def get_symbol_search(folder=SCRIP_CACHE_DIR, max_age=SCRIP_MAX_AGE):
+    """The SymbolSearchIndex for the current cache, built once per process."""
+    return _get("search", SymbolSearchIndex, folder, max_age)
+
+
+def read_row(columns, categories, i):
+    """One scrip master row as a dict, read straight from the mapped columns."""
+    rec = {}
+    for name in COLUMNS:
+        value = columns[name][i]
+        if name in CATEGORY_COLUMNS:
+            value = categories[name][value]
+        elif name == "expiry_date":
+            value = str(value)
+        else:
+            value = value.item()
+        rec[name] = value
+    return rec
+
+
+# ================= FLATTRADE SYMBOLS =================
+def _expiry_formats(categories, fmt):
+    """One formatted string per expiry category ('' where it does not parse)."""
+    out = []
+    for value in categories:
+        try:
+            out.append(datetime.strptime(value, "%d%b%Y").strftime(fmt).upper())
+        except ValueError:
+            out.append("")
+    return np.array(out, dtype=str)
+
+
+def flattrade_tsyms(columns, meta, rows=None):
+    """
+    Flattrade trading symbols for scrip master rows (all rows, or the `rows`
+    index array), in one vectorized pass. Rows that are not CE/PE options
+    with a strike and expiry get "".
+
+      NFO: [NAME][DDMMMYY][C/P][STRIKE]   e.g. NIFTY24FEB26C26000
+      BFO: [NAME][YYMMM][STRIKE][CE/PE]   e.g. SENSEX26FEB82000CE
+    """
+    take = (lambda a: np.asarray(a)) if rows is None else (lambda a: np.asarray(a)[rows])
+    categories = meta["categories"]
+    symbol = take(columns["symbol"])
+    strike = take(columns["strike"])
+    expiry_codes = take(columns["expiry"])
+    name = np.array(categories["name"], dtype=str)[take(columns["name"])]
+    exch = np.array(categories["exch_seg"], dtype=str)[take(columns["exch_seg"])]
+
+    is_ce = np.char.endswith(symbol, "CE")
+    is_pe = np.char.endswith(symbol, "PE")
+    strike_txt = np.char.mod("%.0f", np.nan_to_num(strike))
+    nfo_exp = _expiry_formats(categories["expiry"], "%d%b%y")[expiry_codes]
+    bfo_exp = _expiry_formats(categories["expiry"], "%y%b")[expiry_codes]
+
+    nfo = np.char.add(np.char.add(np.char.add(name, nfo_exp), np.where(is_ce, "C", "P")), strike_txt)
+    bfo = np.char.add(np.char.add(np.char.add(name, bfo_exp), strike_txt), np.where(is_ce, "CE", "PE"))
+    tsyms = np.where(np.isin(exch, ("BFO", "BSE")), bfo, nfo)
+    valid = (is_ce | is_pe) & ~np.isnan(strike) & (nfo_exp != "")
+    return np.where(valid, tsyms, "")
+
+
+# ================= OPTION CHAIN INDEX =================
+class OptionChainIndex:
+    """
+    Options keyed (exch_seg, name) -> expiry -> strike -> {"CE": row, "PE": row},
+    with expiries (by date) and strikes pre-sorted, so every selection is a
+    dictionary lookup instead of a scan over the whole scrip master. Every
+    indexed contract also carries its Flattrade tsym, with a reverse map.
+    """
+
+    def __init__(self, columns, meta):
+        self.columns = columns
+        self.categories = meta["categories"]
+        symbol = np.asarray(columns["symbol"])
+        opt_type = np.where(np.char.endswith(symbol, "CE"), 0, np.where(np.char.endswith(symbol, "PE"), 1, -1))
+        strike = np.asarray(columns["strike"])
+        expiry_date = np.asarray(columns["expiry_date"])
+        rows = np.flatnonzero((opt_type >= 0) & ~np.isnan(strike) & ~np.isnat(expiry_date))
+        # Sorted by segment, underlying, expiry date and strike so the nested dicts come out ordered
+        exch_codes = np.asarray(columns["exch_seg"])[rows]
+        name_codes = np.asarray(columns["name"])[rows]
+        order = np.lexsort((strike[rows], expiry_date[rows], name_codes, exch_codes))
+        rows = rows[order]
+
+        exch_cat, name_cat, expiry_cat = self.categories["exch_seg"], self.categories["name"], self.categories["expiry"]
+        self.chains = {}
+        expiry_codes = np.asarray(columns["expiry"])[rows]
+        for row, e, n, x, k, t in zip(rows.tolist(), exch_codes[order].tolist(), name_codes[order].tolist(),
+                                      expiry_codes.tolist(), strike[rows].tolist(), opt_type[rows].tolist()):
+            by_expiry = self.chains.setdefault((exch_cat[e], name_cat[n]), {})
+            by_strike = by_expiry.setdefault(expiry_cat[x], {})
+            by_strike.setdefault(k, {})["CE" if t == 0 else "PE"] = row
+        # Flattrade symbols for every indexed contract, and the way back
+        tsyms = flattrade_tsyms(columns, meta, rows).tolist()
+        self.tsym_of = dict(zip(rows.tolist(), tsyms))
+        self.by_tsym = dict(zip(tsyms, rows.tolist()))
+        self.strike_lists = {(key, expiry): list(strikes)
+                             for key, by_expiry in self.chains.items() for expiry, strikes in by_expiry.items()}
+
+    def __len__(self):
+        return sum(len(s) for by_expiry in self.chains.values() for s in by_expiry.values())
+
+    def underlyings(self, exch_seg=None):
+        return sorted(name for exch, name in self.chains if exch_seg is None or exch == exch_seg)
+
+    def expiries(self, name, exch_seg):
+        """Expiry strings (e.g. 26FEB2026) for an underlying, nearest first."""
+        return list(self.chains.get((exch_seg, name), ()))
+
+    def strikes(self, name, exch_seg, expiry):
+        """Strikes (rupees) of one expiry, ascending."""
+        return self.strike_lists.get(((exch_seg, name), expiry), [])
+
+    def row(self, i):
+        rec = read_row(self.columns, self.categories, i)
+        rec["tsym"] = self.tsym_of.get(i, "")
+        return rec
+
+    def lookup_tsym(self, tsym):
+        """Row dict (AngelOne token etc.) for a Flattrade tsym, or None."""
+        i = self.by_tsym.get(tsym.strip().upper())
+        return None if i is None else self.row(i)
+
+    def tokens_for(self, tsyms):
+        """{tsym: AngelOne token} for the tsyms that are known."""
+        token = self.columns["token"]
+        return {t: token[self.by_tsym[t]].item() for t in tsyms if t in self.by_tsym}
+
+    def contract(self, name, exch_seg, expiry, strike, opt_type):
+        """Row dict of the CE/PE contract, or None."""
+        i = self.chains.get((exch_seg, name), {}).get(expiry, {}).get(float(strike), {}).get(opt_type)
+        return None if i is None else self.row(i)
+
+    def pair(self, name, exch_seg, expiry, strike):
+        """(CE row, PE row) for a strike; either may be None."""
+        return (self.contract(name, exch_seg, expiry, strike, "CE"),
+                self.contract(name, exch_seg, expiry, strike, "PE"))
+
+
+# ================= SYMBOL SEARCH =================
+SEARCH_STRIP = (" ", "-", "&", ".", "_")
+# Ranking weights: exact > prefix > fuzzy (trigram overlap); shorter symbols win ties
+SCORE_EXACT = 100.0
+SCORE_PREFIX = 50.0
+SCORE_NAME_EXACT = 60.0
+SCORE_NAME_PREFIX = 30.0
+SCORE_TOKEN = 120.0
+SCORE_TRIGRAM = 40.0
+MIN_TRIGRAM_FRACTION = 0.5  # fuzzy matches must share at least this share of the query's trigrams
+
+
+def search_key(text):
+    """Upper-case with separators removed: 'reliance eq' and 'RELIANCE-EQ' share a key."""
+    text = str(text).upper()
+    for ch in SEARCH_STRIP:
+        text = text.replace(ch, "")
+    return text
+
+
+def _search_keys(values):
+    keys = np.char.upper(np.asarray(values, dtype=str))
+    for ch in SEARCH_STRIP:
+        keys = np.char.replace(keys, ch, "")
+    return keys
+
+
+def _trigram_codes(key_bytes):
+    """(n, width) uint8 key matrix -> (codes, rows) of every trigram, 24-bit codes."""
+    m = key_bytes.astype(np.int32)
+    codes, rows = [], []
+    row_ids = np.arange(len(m), dtype=np.int32)
+    for k in range(m.shape[1] - 2):
+        valid = m[:, k + 2] != 0
+        codes.append(((m[valid, k] << 16) | (m[valid, k + 1] << 8) | m[valid, k + 2]))
+        rows.append(row_ids[valid])
+    if not codes:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return np.concatenate(codes), np.concatenate(rows)
+
+
+class SymbolSearchIndex:
+    """
+    Search over every scrip master symbol. Sorted symbol/token keys give
+    exact and prefix ranges by binary search; a trigram index (CSR: sorted
+    trigram codes -> row ids) gives typo-tolerant matches. Scoring is
+    vectorized over the whole universe, so a query costs a few ms.
+    """
+
+    def __init__(self, columns, meta):
+        self.columns = columns
+        self.meta = meta
+        self.categories = meta["categories"]
+        keys = _search_keys(columns["symbol"])
+        self.n = len(keys)
+        self.key_len = np.char.str_len(keys).astype(np.int32)
+
+        self.symbol_order = np.argsort(keys, kind="stable")
+        self.symbol_keys = keys[self.symbol_order]
+        # Tie-breaks folded into one sort key: shorter symbols first, then alphabetical
+        rank = np.empty(self.n, dtype=np.float64)
+        rank[self.symbol_order] = np.arange(self.n)
+        self.tie_break = self.key_len * 1e-3 + rank / max(self.n, 1) * 1e-3
+        tokens = np.asarray(columns["token"])
+        self.token_order = np.argsort(tokens, kind="stable")
+        self.token_keys = tokens[self.token_order]
+        # Stripping separators reorders names (M&M -> MM), so name keys get their own sort order
+        name_keys = _search_keys(self.categories["name"]) if self.categories["name"] else np.empty(0, dtype=str)
+        self.name_order = np.argsort(name_keys, kind="stable")
+        self.name_keys = name_keys[self.name_order]
+        self.name_codes = np.asarray(columns["name"])
+        self.exch_codes = np.asarray(columns["exch_seg"])
+
+        key_bytes = np.char.encode(keys, "ascii", "ignore")
+        width = max(key_bytes.dtype.itemsize, 1)
+        matrix = np.frombuffer(key_bytes.tobytes(), dtype=np.uint8).reshape(self.n, width) if self.n else \
+            np.zeros((0, width), dtype=np.uint8)
+        codes, rows = _trigram_codes(matrix)
+        # One entry per (trigram, row), grouped by trigram: sort packed pairs, drop repeats
+        pairs = (codes.astype(np.int64) << 32) | rows.astype(np.int64)
+        pairs.sort()
+        if len(pairs):
+            pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        self.trigram_rows = (pairs & 0xFFFFFFFF).astype(np.int32)
+        gram = pairs >> 32
+        self.trigram_starts = np.flatnonzero(np.concatenate(([True], gram[1:] != gram[:-1]))) if len(gram) else \
+            np.empty(0, dtype=np.intp)
+        self.trigram_codes = gram[self.trigram_starts]
+        self.trigram_ends = np.append(self.trigram_starts[1:], len(pairs))
+
+    @staticmethod
+    def _range(sorted_keys, key, prefix):
+        lo = np.searchsorted(sorted_keys, key, "left")
+        hi = np.searchsorted(sorted_keys, key + "\uffff" if prefix else key, "right")
+        return lo, hi
+
+    def _name_mask(self, lo, hi):
+        """Rows whose name is one of the sorted name keys [lo, hi)."""
+        matched = np.zeros(len(self.name_keys), dtype=bool)
+        matched[self.name_order[lo:hi]] = True
+        return matched[self.name_codes]
+
+    def _trigram_hits(self, key):
+        grams = {key[i:i + 3] for i in range(len(key) - 2)}
+        lists = []
+        for gram in grams:
+            b = gram.encode("ascii", "ignore")
+            if len(b) != 3:
+                continue
+            code = (b[0] << 16) | (b[1] << 8) | b[2]
+            i = np.searchsorted(self.trigram_codes, code)
+            if i < len(self.trigram_codes) and self.trigram_codes[i] == code:
+                lists.append(self.trigram_rows[self.trigram_starts[i]:self.trigram_ends[i]])
+        if not grams or not lists:
+            return None, len(grams)
+        return np.bincount(np.concatenate(lists), minlength=self.n), len(grams)
+
+    def search(self, query, limit=20, exch_seg=None):
+        """Ranked row dicts (with a 'score' and Flattrade 'tsym' where one exists) for a free-text query."""
+        key = search_key(query)
+        if not key or not self.n:
+            return []
+        score = np.zeros(self.n, dtype=np.float64)
+
+        lo, hi = self._range(self.symbol_keys, key, True)
+        score[self.symbol_order[lo:hi]] += SCORE_PREFIX
+        lo, hi = self._range(self.symbol_keys, key, False)
+        score[self.symbol_order[lo:hi]] += SCORE_EXACT
+        lo, hi = self._range(self.token_keys, str(query).strip(), False)
+        score[self.token_order[lo:hi]] += SCORE_TOKEN
+
+        lo, hi = self._range(self.name_keys, key, True)
+        if hi > lo:
+            score += SCORE_NAME_PREFIX * self._name_mask(lo, hi)
+            elo, ehi = self._range(self.name_keys, key, False)
+            if ehi > elo:
+                score += SCORE_NAME_EXACT * self._name_mask(elo, ehi)
+
+        counts, total = self._trigram_hits(key)
+        if counts is not None:
+            fraction = counts / total
+            score += np.where(fraction >= MIN_TRIGRAM_FRACTION, SCORE_TRIGRAM * fraction, 0.0)
+
+        if exch_seg:
+            segs = [self.categories["exch_seg"].index(s) for s in np.atleast_1d(exch_seg)
+                    if s in self.categories["exch_seg"]]
+            score[~np.isin(self.exch_codes, segs)] = 0.0
+
+        hits = np.flatnonzero(score > 0)
+        if not len(hits):
+            return []
+        rank = self.tie_break[hits] - score[hits]
+        if len(hits) > limit:
+            # Top `limit` without sorting every hit
+            part = np.argpartition(rank, limit - 1)[:limit]
+            hits, rank = hits[part], rank[part]
+        rows = hits[np.argsort(rank, kind="stable")]
+
+        tsyms = flattrade_tsyms(self.columns, self.meta, rows).tolist()
+        results = []
+        for i, tsym, s in zip(rows.tolist(), tsyms, score[rows].tolist()):
+            rec = read_row(self.columns, self.categories, i)
+            rec["tsym"] = tsym
+            rec["score"] = round(s, 1)
+            results.append(rec)
+        return results
+
@@ -0,0 +1,188 @@
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from bars import BAR_DTYPE, BAR_RETENTION
+
+# ================= SNAPSHOT LAYOUT =================
+# Fixed header followed by a ring of `capacity` BAR_DTYPE rows. Bar with
+# sequence number n lives in slot n % capacity.
+#
+#   magic(8s) layout(I) capacity(I) seq(Q) total(Q) epoch(d)
+#   ltp(d) alma(d) last_update(d) exchange_type(i) token(16s)
+#   tick_ns(Q) publish_ns(Q)
+#
+# tick_ns / publish_ns are time.monotonic_ns() stamps of the latest tick's
+# arrival and of this publish, for tick-to-order latency accounting.
+#
+# `seq` is a seqlock: the writer makes it odd before touching anything and
+# even again once done, so readers retry instead of seeing torn data.
+SNAPSHOT_FILE = "market_data_{token}.bin"
+MAGIC = b"MKTSNAP1"
+LAYOUT_VERSION = 3
+HEADER_FMT = "<8sIIQQddddi16sQQ"
+HEADER_SIZE = 128
+SEQ_OFFSET = 16
+_SEQ = struct.Struct("<Q")
+
+assert struct.calcsize(HEADER_FMT) <= HEADER_SIZE
+
+
+def snapshot_path(token_id):
+    return SNAPSHOT_FILE.format(token=token_id)
+
+
+def snapshot_size(capacity):
+    return HEADER_SIZE + capacity * BAR_DTYPE.itemsize
+
+
+class SnapshotWriter:
+    """Publishes LTP, latest ALMA and new bars into a memory-mapped file."""
+
+    def __init__(self, path, capacity=BAR_RETENTION, token_id="", exchange_type=0):
+        self.path = path
+        self.capacity = capacity
+        self.token_id = str(token_id)
+        self.exchange_type = int(exchange_type)
+        self.published = 0
+        self.epoch = time.time()
+
+        size = snapshot_size(capacity)
+        # Reuse an existing file of the right size so readers' mappings stay valid
+        mode = "r+b" if os.path.exists(path) and os.path.getsize(path) == size else "w+b"
+        self._file = open(path, mode)
+        if mode == "w+b":
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._bars = np.frombuffer(self._mm, dtype=BAR_DTYPE, count=capacity, offset=HEADER_SIZE)
+        self._seq = 0
+        self._write_header(ltp=0.0, alma=0.0, total=0)
+
+    def _write_header(self, ltp, alma, total, tick_ns=0):
+        struct.pack_into(
+            HEADER_FMT, self._mm, 0,
+            MAGIC, LAYOUT_VERSION, self.capacity, self._seq, total, self.epoch,
+            float(ltp), float(alma), time.time(), self.exchange_type,
+            self.token_id.encode()[:16], int(tick_ns), time.monotonic_ns(),
+        )
+
+    def publish(self, ltp, alma, store, tick_ns=0):
+        """Write the header plus every bar in `store` not yet published."""
+        new = store.since(self.published)
+        total = store.total
+
+        self._seq += 1
+        _SEQ.pack_into(self._mm, SEQ_OFFSET, self._seq)
+        if len(new):
+            if len(new) > self.capacity:
+                new = new[-self.capacity:]
+            first = total - len(new)
+            slots = np.arange(first, total) % self.capacity
+            self._bars[slots] = new
+        self._write_header(ltp, alma if alma is not None else 0.0, total, tick_ns)
+        self._seq += 1
+        _SEQ.pack_into(self._mm, SEQ_OFFSET, self._seq)
+        self.published = total
+
+    def close(self):
+        try:
+            del self._bars
+            self._mm.close()
+            self._file.close()
+        except Exception:
+            pass
+
+
+class SnapshotReader:
+    """
+    Incremental reader for a SnapshotWriter file.
+    Keeps its own cursor so poll() only returns bars it has not seen yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seen = 0
+        self.epoch = None
+        self._mm = None
+        self._size = 0
+
+    def _open(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if self._mm is not None and size == self._size:
+            return True
+        self.close()
+        if size < HEADER_SIZE:
+            return False
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC or struct.unpack_from("<I", self._mm, 8)[0] != LAYOUT_VERSION:
+            self.close()
+            return False
+        self._size = size
+        return True
+
+    def _unpack(self):
+        magic, layout, capacity, seq, total, epoch, ltp, alma, last_update, exch, token, tick_ns, publish_ns = \
+            struct.unpack_from(HEADER_FMT, self._mm, 0)
+        return {
+            "seq": seq,
+            "capacity": capacity,
+            "total": total,
+            "epoch": epoch,
+            "ltp": ltp,
+            "alma": alma,
+            "last_update": last_update,
+            "exchange_type": exch,
+            "token_id": token.rstrip(b"\0").decode(),
+            "tick_ns": tick_ns,
+            "publish_ns": publish_ns,
+        }
+
+    def header(self, retries=100):
+        """Consistent header dict, or None if the snapshot is unavailable."""
+        if not self._open():
+            return None
+        for _ in range(retries):
+            h = self._unpack()
+            if h["seq"] % 2 == 0 and _SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] == h["seq"]:
+                return h
+        return None
+
+    def poll(self, retries=100):
+        """
+        Returns (header, new_bars, reset) or None.
+        `reset` is True when the writer restarted and previously returned bars
+        no longer belong to the current session.
+        """
+        if not self._open():
+            return None
+        for _ in range(retries):
+            h = self._unpack()
+            if h["seq"] % 2:
+                continue
+            capacity, total = h["capacity"], h["total"]
+            reset = h["epoch"] != self.epoch or total < self.seen
+            seen = 0 if reset else self.seen
+            start = max(seen, total - capacity)
+            ring = np.frombuffer(self._mm, dtype=BAR_DTYPE, count=capacity, offset=HEADER_SIZE)
+            bars = ring[np.arange(start, total) % capacity] if total > start else ring[:0].copy()
+            del ring
+            if _SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] != h["seq"]:
+                continue
+            self.epoch = h["epoch"]
+            self.seen = total
+            return h, bars, reset
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+        self._mm = None
+        self._size = 0
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from logzero import logger
+from control import connect
+from reconnect import Backoff
+from execution import get_execution_engine
+from order import get_order_client
+from latency import now_ns
+
+# ================= STRATEGY RUNNER CONFIG =================
+# Headless ALMA crossover runner. Subscribes to bar-close events from the
+# running backend over its control channel, evaluates every closed bar and
+# places orders itself, so no browser tab has to be open.
+#
+#   python strategy.py --token 472789 --tsym NIFTY24FEB26C26000 --qty 65 --exch NFO
+STATE_FILE = "strategy_state.json"
+STOP_FILE = "stop_strategy.txt"
+MAX_LOGS = 100
+HEARTBEAT_INTERVAL = 5  # state file refresh while idle, so the UI can tell the runner is alive
+
+WAIT_FOR_DIP = "WAIT_FOR_DIP"
+BUY = "BUY"
+SELL = "SELL"
+
+
+class AlmaCrossoverStrategy:
+    """
+    WAIT_FOR_DIP -> (close < ALMA) -> BUY -> (close > ALMA) buy -> SELL -> (close < ALMA) sell -> WAIT_FOR_DIP.
+    on_bar() returns 'B' / 'S' when an order is due; the phase only advances once filled() confirms it.
+    """
+
+    def __init__(self, phase=WAIT_FOR_DIP):
+        self.phase = phase
+
+    def on_bar(self, close, alma):
+        if alma is None or alma != alma:  # no ALMA yet (NaN)
+            return None
+        if self.phase == WAIT_FOR_DIP:
+            if close < alma:
+                self.phase = BUY  # armed
+            return None
+        if self.phase == BUY and close > alma:
+            return 'B'
+        if self.phase == SELL and close < alma:
+            return 'S'
+        return None
+
+    def filled(self, side):
+        self.phase = SELL if side == 'B' else WAIT_FOR_DIP
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StrategyRunner:
+    def __init__(self, token, tsym, qty, exch, close_on_stop=True, state_file=STATE_FILE):
+        self.token = str(token)
+        self.tsym = tsym
+        self.qty = int(qty)
+        self.exch = exch
+        self.close_on_stop = close_on_stop
+        self.state_file = state_file
+        self.engine = get_execution_engine()
+        self.logs = []
+        self.last_bar = None
+        self.last_order = None
+
+        # Resume the persisted phase if it belongs to the same instrument
+        saved = load_state(state_file) or {}
+        phase = WAIT_FOR_DIP
+        if saved.get("token") == self.token and saved.get("tsym") == self.tsym:
+            phase = saved.get("phase", WAIT_FOR_DIP)
+            self.logs = saved.get("logs", [])[-MAX_LOGS:]
+            self.last_order = saved.get("last_order")
+        self.strategy = AlmaCrossoverStrategy(phase)
+        self.running = False
+        self.saved_at = 0.0
+
+    def log(self, message):
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+        logger.info(line)
+        self.logs = (self.logs + [line])[-MAX_LOGS:]
+
+    def save_state(self):
+        data = {
+            "token": self.token,
+            "tsym": self.tsym,
+            "qty": self.qty,
+            "exch": self.exch,
+            "phase": self.strategy.phase,
+            "running": self.running,
+            "pid": os.getpid(),
+            "last_bar": self.last_bar,
+            "last_order": self.last_order,
+            "logs": self.logs,
+            "updated": time.time(),
+        }
+        self.saved_at = data["updated"]
+        temp_file = self.state_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(data, f)
+        # Small retry loop for Windows file locks held by the UI
+        for _ in range(3):
+            try:
+                os.replace(temp_file, self.state_file)
+                break
+            except PermissionError:
+                time.sleep(0.1)
+
+    def place(self, side, price, timeline=None):
+        label = "BUY" if side == 'B' else "SELL"
+        result = self.engine.submit(self.tsym, self.qty, self.exch, side, timeline).result()
+        if result.ok:
+            self.strategy.filled(side)
+            self.last_order = {"side": label, "price": price, "time": time.time(),
+                               "latency_ms": round(result.latency_ms, 2), "response": result.response}
+            self.log(f"✅ AUTO {label}: {self.tsym} @ {price} in {result.latency_ms:.0f} ms")
+        else:
+            self.log(f"❌ {label} FAILED: {result.response.get('emsg')}")
+        return result.ok
+
+    def on_event(self, event, recv_ns):
+        if event.get("event") != "bar" or event.get("token") != self.token:
+            return
+        close, alma = event["close"], event["alma"]
+        self.last_bar = {"seq": event["seq"], "time": event["time"], "close": close, "alma": alma}
+        phase = self.strategy.phase
+        side = self.strategy.on_bar(close, alma)
+        if side is not None:
+            timeline = [("tick", event.get("tick_ns", 0)), ("bar", event.get("bar_ns", 0)), ("event", recv_ns)]
+            cross = "above" if side == 'B' else "below"
+            self.log(f"Bar {event['seq']} closed {cross} ALMA ({close:.2f} vs {alma:.2f})")
+            self.place(side, close, timeline)
+        elif self.strategy.phase != phase:
+            self.log(f"📉 Bar close below ALMA ({close:.2f} < {alma:.2f}). Strategy ARMED for BUY.")
+        # Persist phase changes durably; otherwise the idle heartbeat refreshes last_bar
+        if side is not None or self.strategy.phase != phase:
+            self.save_state()
+
+    def stop_requested(self):
+        return os.path.exists(STOP_FILE)
+
+    def run(self):
+        if os.path.exists(STOP_FILE):
+            os.remove(STOP_FILE)
+        self.running = True
+        self.log(f"🤖 Strategy runner started for {self.tsym} (token {self.token}), phase {self.strategy.phase}")
+        self.save_state()
+        get_order_client().keep_warm()
+
+        backoff = Backoff()
+        try:
+            while not self.stop_requested():
+                conn = connect()
+                if conn is None:
+                    delay = backoff.next()
+                    logger.warning(f"Backend control channel not reachable, retrying in {delay:.1f}s")
+                    self.wait(delay)
+                    continue
+                try:
+                    conn.send({"cmd": "events", "tokens": [self.token]})
+                    backoff.reset()
+                    while not self.stop_requested():
+                        # Short poll timeout so the stop file and keep-alive are serviced
+                        if not conn.poll(0.5):
+                            get_order_client().keep_warm()
+                            if time.time() - self.saved_at > HEARTBEAT_INTERVAL:
+                                self.save_state()
+                            continue
+                        msg = conn.recv()
+                        recv_ns = now_ns()
+                        if "event" in msg:
+                            self.on_event(msg, recv_ns)
+                        elif msg.get("stat") != "Ok":
+                            self.log(f"⚠️ Backend refused event subscription: {msg.get('emsg')}")
+                except (EOFError, OSError) as e:
+                    logger.warning(f"Backend connection lost: {e}")
+                finally:
+                    conn.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # AUTO CLOSE: an open position (phase SELL) is sold before stopping
+            if self.close_on_stop and self.strategy.phase == SELL:
+                self.log("🛑 Stopping. Closing open position first...")
+                self.place('S', self.last_bar["close"] if self.last_bar else 0.0)
+            self.running = False
+            self.log("🛑 Strategy Stopped.")
+            self.save_state()
+            if os.path.exists(STOP_FILE):
+                os.remove(STOP_FILE)
+
+    def wait(self, seconds):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end and not self.stop_requested():
+            time.sleep(0.2)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Headless ALMA crossover strategy runner")
+    parser.add_argument("--token", required=True, help="Backend token whose bars drive the strategy")
+    parser.add_argument("--tsym", required=True, help="Flattrade trading symbol to order")
+    parser.add_argument("--qty", type=int, required=True)
+    parser.add_argument("--exch", default="NFO")
+    parser.add_argument("--no-close-on-stop", action="store_true", help="Leave an open position when stopping")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    StrategyRunner(args.token, args.tsym, args.qty, args.exch, not args.no_close_on_stop).run()
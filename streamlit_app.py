@@ -15,12 +15,21 @@ import re
 from datetime import datetime
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
 from streamlit_lightweight_charts import renderLightweightCharts
-from order import place_flattrade_order
+from execution import get_execution_engine
+from latency import load_metrics
+from strategy import load_state as load_strategy_state, STOP_FILE as STRATEGY_STOP_FILE, HEARTBEAT_INTERVAL as STRATEGY_HEARTBEAT
+from snapshot import SnapshotReader, snapshot_path
+from bars import ohlc_records, alma_records
+from journal import JournalReader
+from control import send_command
+from scripmaster import get_option_chain, get_symbol_search, get_refresher as get_scrip_refresher, read_meta as read_scrip_meta
 
 # ================= STREAMLIT CONFIG =================
 st.set_page_config(layout="wide", page_title="AngelOne Intelligence Hub")
 
 STOP_FILE = "stop_indices.txt"
+MARKET_DATA_FILE = "market_data_{token}.json" # Per-token status file written by backend.py
+IST_OFFSET = 19800 # 5.5 hours in seconds
 
 def safe_get_secret(key, default=None):
     """Safely get a secret from streamlit secrets or environment variables."""
@@ -43,6 +52,85 @@ def fetch_live_indices():
             pass
     return {"NIFTY 50": {"lp": "N/A", "pc": "0.00"}, "SENSEX": {"lp": "N/A", "pc": "0.00"}}
 
+def read_market_status(token_id):
+    """Latest LTP / ALMA / last_update for a token from the backend's binary snapshot, falling back to its JSON file."""
+    reader = SnapshotReader(snapshot_path(token_id))
+    header = reader.header()
+    reader.close()
+    if header and time.time() - header["last_update"] < 10:
+        return {"ltp": header["ltp"], "alma": header["alma"], "last_update": header["last_update"],
+                "tick_ns": header["tick_ns"], "publish_ns": header["publish_ns"]}
+
+    data_file = MARKET_DATA_FILE.format(token=token_id)
+    if os.path.exists(data_file):
+        try:
+            with open(data_file, "r") as f:
+                data = json.load(f)
+            if "latest_alma" in data:
+                alma_val = data["latest_alma"]
+            else:
+                # Legacy full-history format
+                alma = data.get("alma", [])
+                alma_val = alma[-1].get("value", 0.0) if alma else 0.0
+            return {
+                "ltp": float(data.get("ltp", 0.0)),
+                "alma": alma_val,
+                "last_update": data.get("last_update", 0),
+                "tick_ns": data.get("tick_ns", 0),
+                "publish_ns": data.get("publish_ns", 0),
+            }
+        except:
+            pass
+    if header:
+        return {"ltp": header["ltp"], "alma": header["alma"], "last_update": header["last_update"],
+                "tick_ns": header["tick_ns"], "publish_ns": header["publish_ns"]}
+    return None
+
+def strategy_running(state):
+    """True while the headless strategy runner is alive (it refreshes its state file every few seconds)."""
+    return bool(state and state.get("running") and time.time() - state.get("updated", 0) < 3 * STRATEGY_HEARTBEAT)
+
+def sync_snapshot_bars(token_id):
+    """
+    Pull only the bars published since the last poll from the binary snapshot.
+    Returns the snapshot header, or None if the channel is not available.
+    """
+    path = snapshot_path(token_id)
+    reader = st.session_state.get("snapshot_reader")
+    if reader is None or reader.path != path:
+        # New token selected: drop the old chart and start a fresh cursor
+        if reader is not None:
+            st.session_state.ohlc_data = []
+            st.session_state.alma_data = []
+        reader = st.session_state.snapshot_reader = SnapshotReader(path)
+    snap = reader.poll()
+    if snap is None:
+        return None
+
+    header, bars, reset = snap
+    apply_new_bars(bars, reset, header["capacity"])
+    return header
+
+def sync_journal_bars(journal_file, capacity):
+    """Tail the backend's bar journal from the last byte offset this session has seen."""
+    reader = st.session_state.get("journal_reader")
+    if reader is None or reader.path != journal_file:
+        reader = st.session_state.journal_reader = JournalReader(journal_file)
+    result = reader.tail()
+    if result is not None:
+        header, bars, reset = result
+        apply_new_bars(bars, reset, capacity)
+
+def apply_new_bars(bars, reset, capacity):
+    if reset:
+        st.session_state.ohlc_data = []
+        st.session_state.alma_data = []
+    if len(bars):
+        # Apply IST offset (+5:30) for chart display
+        bars["time"] += IST_OFFSET
+        st.session_state.ohlc_data = (st.session_state.ohlc_data + ohlc_records(bars))[-capacity:]
+        st.session_state.alma_data = (st.session_state.alma_data + alma_records(bars))[-capacity:]
+
 def launch_indices_backend(force=False):
     if not force and os.path.exists(STOP_FILE):
         return # Respect manual stop
@@ -109,12 +197,18 @@ def indices_banner_fragment():
 
 @st.fragment(run_every="1s")
 def display_dashboard_fragment(token_id, exchange_type, exchange_mapping):
-    # Data Sync
-    DATA_FILE = "market_data.json"
+    # Data Sync: binary snapshot first (new bars only), JSON file as fallback
+    DATA_FILE = MARKET_DATA_FILE.format(token=token_id)
     data = {}
     data_found = False
     try:
-        if os.path.exists(DATA_FILE):
+        header = sync_snapshot_bars(token_id)
+        if header and time.time() - header["last_update"] < 10:
+            st.session_state.backend_running = True
+            st.session_state.current_ltp = header["ltp"]
+            st.session_state.last_data_ts = header["last_update"]
+            data_found = True
+        elif os.path.exists(DATA_FILE):
             with open(DATA_FILE, "r") as f:
                 data = json.load(f)
             
@@ -122,10 +216,14 @@ def display_dashboard_fragment(token_id, exchange_type, exchange_mapping):
             if time.time() - last_update < 10:
                 st.session_state.backend_running = True
                 
-                # Apply IST offset (+5:30) for chart display
-                IST_OFFSET = 19800 # 5.5 hours in seconds
-                st.session_state.ohlc_data = [{**b, "time": b["time"] + IST_OFFSET} for b in data.get("ohlc", [])]
-                st.session_state.alma_data = [{**b, "time": b["time"] + IST_OFFSET} for b in data.get("alma", [])]
+                if "journal" in data:
+                    sync_journal_bars(data["journal"], data.get("retention", 1000))
+                else:
+                    # Legacy format with the full history inlined; apply IST offset (+5:30) for chart display
+                    st.session_state.ohlc_data = [{**b, "time": b["time"] + IST_OFFSET} for b in data.get("ohlc", [])]
+                    st.session_state.alma_data = [{**b, "time": b["time"] + IST_OFFSET} for b in data.get("alma", [])]
+                # Other channels replace the history, so resync the snapshot cursor next time
+                st.session_state.pop("snapshot_reader", None)
                 
                 st.session_state.current_ltp = float(data.get("ltp", 0.0))
                 st.session_state.last_data_ts = last_update
@@ -165,20 +263,15 @@ def display_dashboard_fragment(token_id, exchange_type, exchange_mapping):
     else:
         st.info("Connected. Waiting for the first bar (5 ticks)...")
             
-    # Trading logic is consolidated in the automation_monitor fragment in 'Order Portal'
+    # Trading logic runs in the headless strategy runner (strategy.py), managed from 'Order Portal'
     # to avoid duplicate executions and ensure consistent state management.
 
     if not data_found:
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, "r") as f:
-                    offline_data = json.load(f)
-                if time.time() - offline_data.get("last_update", 0) < 10:
-                    st.info("Live data detected locally. Connecting...")
-                    st.session_state.backend_running = True
-                    st.rerun()
-            except:
-                pass
+        status = read_market_status(token_id)
+        if status and time.time() - status["last_update"] < 10:
+            st.info("Live data detected locally. Connecting...")
+            st.session_state.backend_running = True
+            st.rerun()
         st.info("System Offline. Start backend in sidebar or ensure it's running.")
 
 # ================= UI Styling =================
@@ -207,12 +300,12 @@ if 'backend_running' not in st.session_state:
     st.session_state.backend_running = False
 if 'last_error' not in st.session_state:
     st.session_state.last_error = None
-if 'auto_trading_active' not in st.session_state:
-    st.session_state.auto_trading_active = False
 if 'trading_logs' not in st.session_state:
     st.session_state.trading_logs = []
 if 'last_order_side' not in st.session_state:
     st.session_state.last_order_side = None
+if 'straddle_basket' not in st.session_state:
+    st.session_state.straddle_basket = None
 
 # Scrip Master & Dashboard Sync State
 if 'selected_expiry' not in st.session_state:
@@ -231,8 +324,6 @@ if 'trade_exch_input' not in st.session_state:
     st.session_state.trade_exch_input = "NFO"
 
 # Automation Strategy State
-if 'trading_phase' not in st.session_state:
-    st.session_state.trading_phase = 'BUY' # Starts with BUY
 if 'last_order_price' not in st.session_state:
     st.session_state.last_order_price = 0.0
 
@@ -284,16 +375,8 @@ if menu == "📊 Dashboard":
                     else:
                         # START BACKEND via Subprocess (External Process)
                         # First check if it's already actually online locally
-                        is_already_online = False
-                        DATA_FILE = "market_data.json"
-                        if os.path.exists(DATA_FILE):
-                            try:
-                                with open(DATA_FILE, "r") as f:
-                                    data = json.load(f)
-                                if time.time() - data.get("last_update", 0) < 10:
-                                    is_already_online = True
-                            except:
-                                pass
+                        status = read_market_status(token_id)
+                        is_already_online = bool(status and time.time() - status["last_update"] < 10)
                         
                         if is_already_online:
                             st.warning(f"Backend for {token_id} is already running locally.")
@@ -310,11 +393,32 @@ if menu == "📊 Dashboard":
                         time.sleep(2)
                         st.rerun()
         else:
+            # Subscription changes go to the live backend over its control channel (no restart)
+            status = send_command({"cmd": "status"}, timeout=0.5)
+            tracked = [t for entry in status.get("token_list", []) for t in entry["tokens"]] if status.get("stat") == "Ok" else []
+            pending = status.get("pending", []) if status.get("stat") == "Ok" else []
+            if tracked or pending:
+                st.caption(f"Tracking: {', '.join(tracked) or '-'}" + (f" · warming up: {', '.join(pending)}" if pending else ""))
+                if token_id not in tracked and token_id not in pending:
+                    c_switch, c_add = st.columns(2)
+                    switch = c_switch.button("🔀 Switch", help=f"Replace {', '.join(tracked)} with {token_id} on the running backend")
+                    add = c_add.button("➕ Add", help=f"Also track {token_id} on the running backend")
+                    if switch or add:
+                        res = send_command({"cmd": "subscribe", "exchange_type": exchange_type, "tokens": [token_id]})
+                        if res.get("stat") == "Ok" and switch:
+                            res = send_command({"cmd": "unsubscribe", "tokens": tracked})
+                        if res.get("stat") == "Ok":
+                            st.toast(f"Backend is adding {selected_exchange_name}:{token_id} (warm start runs in the background)")
+                        else:
+                            st.error(f"Subscription change failed: {res.get('emsg')}")
+                        st.rerun()
+
             if st.button("🛑 Stop Backend System"):
-                # Signal stop via file (backend.py checks for STOP_FILE)
-                STOP_FILE = "stop_backend.txt"
-                with open(STOP_FILE, "w") as f:
-                    f.write("stop")
+                res = send_command({"cmd": "stop"})
+                if res.get("stat") != "Ok":
+                    # Fallback: signal stop via file (backend.py checks for STOP_FILE)
+                    with open("stop_backend.txt", "w") as f:
+                        f.write("stop")
                 st.session_state.backend_running = False
                 st.warning("Stop signal sent to backend.")
                 time.sleep(1)
@@ -333,6 +437,8 @@ if menu == "📊 Dashboard":
             st.session_state.alma_data = []
             st.session_state.alma_slope = 0.0
             st.session_state.current_ltp = 0.0
+            st.session_state.pop("snapshot_reader", None)
+            st.session_state.pop("journal_reader", None)
             st.rerun()
 
     # Call Fragment for Live Updates
@@ -542,66 +648,26 @@ elif menu == "📈 Flattrade Login": # Flattrade Login
 elif menu == "📦 Order Portal": # Order Portal
     st.header("📦 Flattrade Auto-Order Hub")
     # ---------------- AUTOMATION ENGINE ----------------
+    # The crossover state machine runs headless in strategy.py on every bar
+    # close; this page only launches/stops it and shows its persisted state.
     @st.fragment(run_every="1s")
     def automation_monitor():
-        # 1. Strategy Logic & Data Refresh
         ltp = 0.0
-        kama_val = 0.0
+        alma_val = 0.0
         data_available = False
-        
+
         try:
-            DATA_FILE = "market_data.json"
-            if os.path.exists(DATA_FILE):
-                with open(DATA_FILE, "r") as f:
-                    data = json.load(f)
-                
-                ltp = data.get("ltp", 0.0)
-                alma_data = data.get("alma", [])
-                alma_val = alma_data[-1].get("value", 0.0) if alma_data else 0.0
+            status = read_market_status(st.session_state.dashboard_token)
+            if status:
+                ltp = status["ltp"]
+                alma_val = status["alma"]
                 data_available = True
-                
-                # 2. Strategy Logic: Crossover (only if active)
-                if st.session_state.auto_trading_active:
-                    current_phase = st.session_state.trading_phase
-                    tsym = st.session_state.get('trade_tsym')
-                    qty = st.session_state.get('trade_qty', 0)
-                    exch = st.session_state.get('trade_exch')
-                    
-                    if tsym and qty > 0 and exch:
-                        # STATE 1: WAIT FOR DIP (Price must go below ALMA first)
-                        if current_phase == 'WAIT_FOR_DIP':
-                            if ltp < alma_val:
-                                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 📉 Price below ALMA ({ltp:.2f} < {alma_val:.2f}). Strategy ARMED for BUY.")
-                                st.session_state.trading_phase = 'BUY'
-                                st.rerun()
-                        
-                        # STATE 2: BUY (Armed, waiting for cross above)
-                        elif current_phase == 'BUY' and ltp > alma_val:
-                            res = place_flattrade_order(tsym, qty, exch, 'B')
-                            if res.get('stat') == 'Ok':
-                                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ AUTO BUY: {tsym} @ {ltp} (Price crossed above ALMA: {alma_val:.2f})")
-                                st.session_state.trading_phase = 'SELL'
-                                st.session_state.last_order_side = f"BUY @ {ltp}"
-                                st.rerun()
-                            else:
-                                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ BUY FAILED: {res.get('emsg')}")
-                        
-                        # STATE 3: SELL (Bought, waiting for cross below)
-                        elif current_phase == 'SELL' and ltp < alma_val:
-                            res = place_flattrade_order(tsym, qty, exch, 'S')
-                            if res.get('stat') == 'Ok':
-                                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ AUTO SELL: {tsym} @ {ltp} (Price crossed below ALMA: {alma_val:.2f})")
-                                st.session_state.trading_phase = 'WAIT_FOR_DIP' # RESET to wait for next cycle
-                                st.session_state.last_order_side = f"SELL @ {ltp}"
-                                st.rerun()
-                            else:
-                                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ SELL FAILED: {res.get('emsg')}")
-                    else:
-                        if not tsym: st.session_state.trading_logs.append(f"⚠️ Strategy warning: tsym missing.")
         except Exception as e:
             st.session_state.trading_logs.append(f"⚠️ Monitor Error: {e}")
 
-        # 3. UI Display (Market Feed & Logs)
+        runner = load_strategy_state()
+
+        # UI Display (Market Feed & Logs)
         col_m1, col_m2 = st.columns([1, 1])
         with col_m1:
             st.subheader("Live Market Feed")
@@ -610,12 +676,15 @@ elif menu == "📦 Order Portal": # Order Portal
                 st.write(f"**ALMA:** {alma_val:.2f}")
             else:
                 st.info("Waiting for market data...")
-        
+            if runner and runner.get("last_bar"):
+                bar = runner["last_bar"]
+                st.caption(f"Runner last bar #{bar['seq']}: close {bar['close']:.2f} / ALMA {bar['alma']:.2f}")
+
         with col_m2:
             st.subheader("Activity Logs")
             log_container = st.container(height=300)
             with log_container:
-                for log in reversed(st.session_state.trading_logs):
+                for log in reversed(st.session_state.trading_logs + (runner or {}).get("logs", [])):
                     st.write(log)
 
     col1, col2 = st.columns(2)
@@ -647,14 +716,17 @@ elif menu == "📦 Order Portal": # Order Portal
         st.divider()
         
         # Strategy Monitor
+        runner = load_strategy_state()
+        runner_active = strategy_running(runner)
         st.subheader("Strategy Monitor")
         m_c1, m_c2 = st.columns(2)
         with m_c1:
             st.write("**Next Action:**")
-            if st.session_state.trading_phase == 'WAIT_FOR_DIP':
+            phase = runner.get("phase") if runner else 'WAIT_FOR_DIP'
+            if phase == 'WAIT_FOR_DIP':
                 color = "#58a6ff"
                 label = "WAIT FOR DIP"
-            elif st.session_state.trading_phase == 'BUY':
+            elif phase == 'BUY':
                 color = "#26a69a"
                 label = "BUY ON CROSS"
             else:
@@ -663,44 +735,47 @@ elif menu == "📦 Order Portal": # Order Portal
             st.markdown(f"<h3 style='color: {color}; margin:0;'>{label}</h3>", unsafe_allow_html=True)
         with m_c2:
             st.write("**Status:**")
-            st.write("🟢 Active" if st.session_state.auto_trading_active else "🔴 Paused")
+            st.write(f"🟢 Active ({runner['tsym']})" if runner_active else "🔴 Paused")
 
         st.divider()
-        
-        if not st.session_state.auto_trading_active:
+
+        if not runner_active:
             if st.button("🚀 START AUTO TRADING", type="primary", use_container_width=True):
                 if not st.session_state.backend_running:
                     st.error("Backend System is Offline! Start it in the Dashboard first.")
+                elif not trade_tsym:
+                    st.error("Trading Symbol (tsym) is required.")
                 else:
-                    st.session_state.auto_trading_active = True
-                    st.session_state.trading_phase = 'WAIT_FOR_DIP' # INITIAL STATE
-                    st.session_state.last_order_side = None
-                    st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 🤖 Strategy Activated. Waiting for price to dip below ALMA...")
+                    # Headless runner: keeps trading without this tab, reacts on every bar close
+                    cmd = [sys.executable, "strategy.py", "--token", str(st.session_state.dashboard_token),
+                           "--tsym", trade_tsym, "--qty", str(total_qty), "--exch", trade_exch]
+                    subprocess.Popen(cmd, creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0)
+                    st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 🤖 Strategy runner launching for {trade_tsym}...")
+                    time.sleep(1)
                     st.rerun()
         else:
             if st.button("🛑 STOP AUTO TRADING", type="secondary", use_container_width=True):
-                # AUTO CLOSE: If a BUY order was placed (phase is SELL), apply a SELL order before stopping
-                if st.session_state.trading_phase == 'SELL':
-                    tsym = st.session_state.get('trade_tsym')
-                    qty = st.session_state.get('trade_qty', 0)
-                    exch = st.session_state.get('trade_exch')
-                    
-                    if tsym and qty > 0 and exch:
-                        st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 🛑 Stopping. Closing open position first...")
-                        res = place_flattrade_order(tsym, qty, exch, 'S')
-                        if res.get('stat') == 'Ok':
-                            st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ✅ AUTO SELL (STOP-CLOSE): {tsym} @ Market")
-                        else:
-                            st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ STOP-CLOSE FAILED: {res.get('emsg')}")
-                
-                st.session_state.auto_trading_active = False
-                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 🛑 Strategy Stopped.")
+                # The runner closes an open position (phase SELL) itself before exiting
+                with open(STRATEGY_STOP_FILE, "w") as f:
+                    f.write("stop")
+                st.session_state.trading_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] 🛑 Stop signal sent to strategy runner.")
+                time.sleep(1)
                 st.rerun()
 
     with col2:
         # Combined Monitor Fragment Call
         automation_monitor()
         
+        with st.expander("⏱️ Tick-to-Order Latency"):
+            for name, label in (("backend", "Backend (tick → bar → publish)"), ("orders", "Orders (tick → bar → event → submit → sent → ack)")):
+                metrics = load_metrics(name)
+                st.write(f"**{label}**")
+                if not metrics or not metrics.get("histograms_ms"):
+                    st.caption("No samples yet.")
+                    continue
+                rows = [{"stage": k, **v} for k, v in metrics["histograms_ms"].items()]
+                st.dataframe(pd.DataFrame(rows).set_index("stage"), use_container_width=True)
+
         if st.button("🗑️ Clear Logs"):
             st.session_state.trading_logs = []
             st.session_state.last_order_side = None
@@ -714,80 +789,27 @@ elif menu == "📦 Scrip Master":
     indices_banner_fragment()
     st.divider()
     
-    SCRIP_MASTER_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
-    
-    @st.cache_data(ttl=86400) # Cache for 24 hours
-    def fetch_scrip_master():
-        LOCAL_SCRIP_CACHE = "scrip_master.json"
-        
-        # 1. Try Loading from Local Cache first (if fresh)
-        if os.path.exists(LOCAL_SCRIP_CACHE):
-            try:
-                mtime = os.path.getmtime(LOCAL_SCRIP_CACHE)
-                if time.time() - mtime < 86400: # 24 hours
-                    with open(LOCAL_SCRIP_CACHE, "r") as f:
-                        return json.load(f)
-            except Exception as fe:
-                print(f"Cache Load Error: {fe}")
-
-        # 2. Fetch from URL
-        try:
-            with st.spinner("Downloading scrip master (~30MB)..."):
-                response = requests.get(SCRIP_MASTER_URL, timeout=60)
-                if response.status_code == 200:
-                    data = response.json()
-                    # Save to cache
-                    try:
-                        with open(LOCAL_SCRIP_CACHE, "w") as f:
-                            json.dump(data, f)
-                    except:
-                        pass
-                    return data
-                else:
-                    st.error(f"Scrip Master Fetch Failed: HTTP {response.status_code}")
-                    return None
-        except requests.exceptions.Timeout:
-            st.error("Scrip Master Fetch Timeout (60s). Try refreshing or check internet.")
-        except Exception as e:
-            st.error(f"Scrip Master Request Error: {str(e)}")
-        
-        # 3. Fallback to old cache even if stale
-        if os.path.exists(LOCAL_SCRIP_CACHE):
-            try:
-                with open(LOCAL_SCRIP_CACHE, "r") as f:
-                    st.warning("Using stale scrip master data from cache.")
-                    return json.load(f)
-            except:
-                pass
-        return None
-
-    def get_flattrade_tsym(token_data):
-        try:
-            name = token_data['name'].strip().upper()
-            raw_exp = token_data['expiry'].strip().upper()
-            dt = datetime.strptime(raw_exp, '%d%b%Y')
-            
-            strike_val = pd.to_numeric(token_data['strike'], errors='coerce') / 100
-            strike = f"{strike_val:.0f}"
-            
-            exch = token_data['exch_seg']
-            
-            if exch in ['BFO', 'BSE']:
-                # SENSEX BFO format: [NAME][YY][MMM][STRIKE][CE/PE]
-                exp_fmt = dt.strftime('%y%b').upper()
-                opt_type = 'CE' if token_data['symbol'].endswith('CE') else 'PE'
-                return f"{name}{exp_fmt}{strike}{opt_type}"
-            else:
-                # NFO format: [NAME][DD][MMM][YY][C/P][STRIKE]
-                exp_fmt = dt.strftime('%d%b%y').upper()
-                opt_type = 'C' if token_data['symbol'].endswith('CE') else 'P'
-                return f"{name}{exp_fmt}{opt_type}{strike}"
-        except:
-            return "N/A"
+    def scrip_master_status(chain):
+        # Downloads run on the background refresher; the page only reports on them
+        refresher = get_scrip_refresher()
+        status = refresher.status
+        meta = read_scrip_meta()
+        s1, s2 = st.columns([4, 1])
+        with s1:
+            if status["state"] == "downloading":
+                st.caption(f"⏳ Scrip master downloading in the background: {status['bytes'] / 1e6:.1f} MB, {status['rows']} instruments parsed")
+            elif status["state"] == "failed":
+                st.caption(f"⚠️ Scrip master refresh failed: {status['error']}" + (" (using cached copy)" if chain is not None else ""))
+            elif meta is not None:
+                st.caption(f"Scrip master: {meta['rows']} instruments, checked {datetime.fromtimestamp(meta['checked']).strftime('%d %b %H:%M')}")
+        with s2:
+            if st.button("🔄 Check for update", use_container_width=True):
+                refresher.request()
+                st.rerun()
 
-    def render_token_card(title, token_data, color):
+    def render_token_card(title, token_data, color, key_prefix):
         if token_data is not None:
-            tsym = get_flattrade_tsym(token_data)
+            tsym = token_data['tsym'] or "N/A"
             st.markdown(f"""
             <div style="background-color: #161b22; border: 1px solid {color}; border-radius: 12px; padding: 20px; text-align: center;">
                 <div style="color: #8b949e; font-size: 0.9rem; margin-bottom: 10px;">{title}</div>
@@ -797,21 +819,79 @@ elif menu == "📦 Scrip Master":
                 <div style="color: #8b949e; font-size: 0.8rem; margin-top: 10px;">Exchange: {token_data['exch_seg']}</div>
             </div>
             """, unsafe_allow_html=True)
-            if st.button(f"📊 Track {token_data['symbol']}", key=f"track_{token_data['token']}", use_container_width=True):
+            if st.button(f"📊 Track {token_data['symbol']}", key=f"track_{key_prefix}_{token_data['token']}", use_container_width=True):
                 st.session_state.dashboard_token = str(token_data['token'])
                 st.session_state.dashboard_exchange = token_data['exch_seg']
-                # Sync with Order Portal
-                st.session_state.trade_tsym_input = tsym
-                st.session_state.trade_tsym = tsym
-                st.toast(f"🚀 {token_data['symbol']} loaded into Dashboard & Order Portal!")
+                if tsym != "N/A":
+                    # Sync with Order Portal
+                    st.session_state.trade_tsym_input = tsym
+                    st.session_state.trade_tsym = tsym
+                    st.toast(f"🚀 {token_data['symbol']} loaded into Dashboard & Order Portal!")
+                else:
+                    st.toast(f"🚀 {token_data['symbol']} loaded into Dashboard!")
         else:
             st.info(f"No {title} data found")
 
-    raw_data = fetch_scrip_master()
-    if not raw_data:
-        st.error("Failed to load scrip master.")
+    @st.fragment(run_every="1s")
+    def straddle_status():
+        basket = st.session_state.straddle_basket
+        if basket is None:
+            return
+        if not basket.done():
+            st.info("⏳ Straddle legs in flight...")
+            return
+        for r in basket.results():
+            icon = "✅" if r.ok else "❌"
+            detail = r.response.get('norenordno') if r.ok else r.response.get('emsg')
+            st.write(f"{icon} {r.leg.trantype} {r.leg.tsym} x{r.leg.qty}: {detail} ({r.latency_ms:.0f} ms)")
+        st.caption(f"Leg skew: {basket.leg_skew_ms():.2f} ms sent / {basket.fill_skew_ms():.1f} ms responses")
+
+    def straddle_panel(ce_data, pe_data):
+        st.subheader("⚡ Straddle")
+        ce_tsym, pe_tsym = ce_data['tsym'] or "N/A", pe_data['tsym'] or "N/A"
+        exch = ce_data['exch_seg']
+        s1, s2, s3 = st.columns([1, 1, 1])
+        with s1:
+            qty = st.number_input("Quantity per leg", value=int(st.session_state.get('trade_qty', 65)), min_value=1, step=1, key="straddle_qty")
+        in_flight = st.session_state.straddle_basket is not None and not st.session_state.straddle_basket.done()
+        with s2:
+            if st.button("🟢 BUY STRADDLE", use_container_width=True, disabled=in_flight or "N/A" in (ce_tsym, pe_tsym)):
+                st.session_state.straddle_basket = get_execution_engine().straddle(ce_tsym, pe_tsym, qty, exch, 'B')
+        with s3:
+            if st.button("🔴 SELL STRADDLE", use_container_width=True, disabled=in_flight or "N/A" in (ce_tsym, pe_tsym)):
+                st.session_state.straddle_basket = get_execution_engine().straddle(ce_tsym, pe_tsym, qty, exch, 'S')
+        straddle_status()
+
+    def symbol_search():
+        st.subheader("🔎 Symbol Search")
+        search = get_symbol_search()
+        q1, q2 = st.columns([3, 1])
+        with q1:
+            query = st.text_input("Search any instrument", placeholder="e.g. reliance, banknifty 27nov 52000, 472789", key="symbol_query")
+        with q2:
+            segment = st.selectbox("Segment", options=["All"] + search.categories['exch_seg'], key="symbol_segment")
+        if not query:
+            return
+        start = time.perf_counter()
+        results = search.search(query, limit=20, exch_seg=None if segment == "All" else segment)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not results:
+            st.caption(f"No matches ({elapsed_ms:.1f} ms)")
+            return
+        st.caption(f"{len(results)} matches in {elapsed_ms:.1f} ms")
+        table = pd.DataFrame(results)[['symbol', 'token', 'exch_seg', 'name', 'expiry', 'strike', 'lotsize', 'tsym']]
+        st.dataframe(table, use_container_width=True, hide_index=True)
+        labels = [f"{r['symbol']} ({r['exch_seg']} · {r['token']})" for r in results]
+        picked = st.selectbox("Result", options=range(len(results)), format_func=lambda i: labels[i], key="symbol_pick")
+        render_token_card("SEARCH RESULT", results[picked], "#58a6ff", "search")
+
+    chain = get_option_chain()
+    scrip_master_status(chain)
+    if chain is None:
+        st.info("Scrip master is not available yet. It is being downloaded in the background; refresh this page in a moment.")
     else:
-        df = pd.DataFrame(raw_data)
+        symbol_search()
+        st.divider()
         
         # UI Selection Flow
         st.subheader("Tiered Selection")
@@ -826,17 +906,10 @@ elif menu == "📦 Scrip Master":
                 st.session_state.selected_strike = None
                 st.rerun()
 
-        # Filtering for Expiries
-        filtered_df = df[df['name'] == st.session_state.selected_instrument]
-        if st.session_state.selected_instrument == 'SENSEX':
-            filtered_df = filtered_df[filtered_df['exch_seg'].isin(['BFO', 'BSE'])]
-        else:
-            filtered_df = filtered_df[filtered_df['exch_seg'] == 'NFO']
-            
-        exp_list = sorted(
-            [e for e in list(set(filtered_df['expiry'].dropna().str.strip().str.upper())) if e],
-            key=lambda x: datetime.strptime(x, '%d%b%Y')
-        )
+        # SENSEX options trade on BFO, NIFTY options on NFO
+        instrument = st.session_state.selected_instrument
+        segment = 'BFO' if instrument == 'SENSEX' else 'NFO'
+        exp_list = chain.expiries(instrument, segment)
         
         with col2:
             new_exp = st.selectbox("Select Expiry", options=[None] + exp_list, index=0 if not st.session_state.selected_expiry else exp_list.index(st.session_state.selected_expiry)+1)
@@ -846,9 +919,7 @@ elif menu == "📦 Scrip Master":
                 st.rerun()
 
         if st.session_state.selected_expiry:
-            exp_df = filtered_df[filtered_df['expiry'].str.strip().str.upper() == st.session_state.selected_expiry]
-            strike_list = sorted(list(set(pd.to_numeric(exp_df['strike'], errors='coerce') / 100)))
-            strike_list = [f"{s:.0f}" for s in strike_list]
+            strike_list = [f"{s:.0f}" for s in chain.strikes(instrument, segment, st.session_state.selected_expiry)]
             
             with col3:
                 new_strike = st.selectbox("Select Strike", options=[None] + strike_list, index=0 if not st.session_state.selected_strike else strike_list.index(st.session_state.selected_strike)+1)
@@ -858,15 +929,15 @@ elif menu == "📦 Scrip Master":
 
         if st.session_state.selected_strike:
             st.divider()
-            strike_float = float(st.session_state.selected_strike) * 100
-            final_df = exp_df[pd.to_numeric(exp_df['strike'], errors='coerce') == strike_float]
-            
-            ce_token = final_df[final_df['symbol'].str.endswith('CE', na=False)].to_dict('records')
-            pe_token = final_df[final_df['symbol'].str.endswith('PE', na=False)].to_dict('records')
+            ce_token, pe_token = chain.pair(instrument, segment, st.session_state.selected_expiry,
+                                            float(st.session_state.selected_strike))
             
             c1, c2 = st.columns(2)
-            with c1: render_token_card("CALL OPTION", ce_token[0] if ce_token else None, "#26a69a")
-            with c2: render_token_card("PUT OPTION", pe_token[0] if pe_token else None, "#ef5350")
+            with c1: render_token_card("CALL OPTION", ce_token, "#26a69a", "ce")
+            with c2: render_token_card("PUT OPTION", pe_token, "#ef5350", "pe")
+
+            if ce_token and pe_token:
+                straddle_panel(ce_token, pe_token)
             
             if st.button("Clear Selection"):
                 st.session_state.selected_expiry = None
@@ -0,0 +1,149 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from indicators import ALMA_PERIOD, ALMA_OFFSET, ALMA_SIGMA
+from bars import TICK_BAR_SIZE
+from backtest import aggregate_ticks, backtest_bars, load_prices
+
+# ================= PARAMETER SWEEP =================
+# Grid / random search over (period, offset, sigma, bar_size) on all cores.
+# The tick array is copied once into shared memory; workers attach to it
+# and cache one bar aggregation per bar size, so tasks only carry params.
+#
+#   python sweep.py ticks.npz --mode random --samples 5000 --out sweep.parquet
+DEFAULT_PERIODS = sorted({max(2, int(ALMA_PERIOD * f)) for f in (0.25, 0.5, 0.75, 1.0, 1.25, 1.5)})
+DEFAULT_OFFSETS = [round(ALMA_OFFSET + d, 2) for d in (-0.1, -0.05, 0.0, 0.05, 0.1)]
+DEFAULT_SIGMAS = [ALMA_SIGMA + d for d in (-2.0, -1.0, 0.0, 1.0, 2.0)]
+DEFAULT_BAR_SIZES = sorted({max(1, TICK_BAR_SIZE + d) for d in (-2, 0, 5, 15)})
+CHUNK_SIZE = 64  # combinations per task
+RESULT_COLUMNS = ["bar_size", "period", "offset", "sigma", "pnl", "realized_pnl", "trades", "wins",
+                  "max_drawdown", "open_position", "bars"]
+
+# Worker-process globals
+_shm = None
+_prices = None
+_bar_cache = {}
+_qty = 1
+_cost = 0.0
+
+
+def _init_worker(shm_name, length, qty, cost):
+    global _shm, _prices, _qty, _cost
+    try:
+        _shm = shared_memory.SharedMemory(name=shm_name, track=False)  # Python 3.13+
+    except TypeError:
+        # Older Pythons register the attached segment again, with the parent's own resource
+        # tracker (inherited under fork, spawn and forkserver alike). That duplicate is harmless;
+        # unregistering it here would drop the parent's registration instead.
+        _shm = shared_memory.SharedMemory(name=shm_name)
+    _prices = np.ndarray((length,), dtype=np.float64, buffer=_shm.buf)
+    _qty, _cost = qty, cost
+
+
+def _closes(bar_size):
+    closes = _bar_cache.get(bar_size)
+    if closes is None:
+        closes = _bar_cache[bar_size] = aggregate_ticks(_prices, bar_size=bar_size)["close"].copy()
+    return closes
+
+
+def _run_chunk(combos):
+    results = []
+    for bar_size, period, offset, sigma in combos:
+        result = backtest_bars(_closes(bar_size), period, offset, sigma, _qty, _cost)
+        result["bar_size"] = bar_size
+        results.append(result)
+    return results
+
+
+def grid(periods=DEFAULT_PERIODS, offsets=DEFAULT_OFFSETS, sigmas=DEFAULT_SIGMAS, bar_sizes=DEFAULT_BAR_SIZES):
+    return [(b, p, o, s) for b, p, o, s in itertools.product(bar_sizes, periods, offsets, sigmas)]
+
+
+def random_combos(samples, period_range=(10, 2 * ALMA_PERIOD), offset_range=(0.5, 0.99),
+                  sigma_range=(1.0, 2 * ALMA_SIGMA), bar_sizes=DEFAULT_BAR_SIZES, seed=None):
+    rng = np.random.default_rng(seed)
+    combos = zip(
+        rng.choice(bar_sizes, samples).tolist(),
+        rng.integers(period_range[0], period_range[1] + 1, samples).tolist(),
+        np.round(rng.uniform(*offset_range, samples), 3).tolist(),
+        np.round(rng.uniform(*sigma_range, samples), 2).tolist(),
+    )
+    return sorted(set(combos))
+
+
+def sweep(prices, combos, workers=None, qty=1, cost=0.0, chunk_size=CHUNK_SIZE):
+    """Evaluate every (bar_size, period, offset, sigma) combination; returns a DataFrame."""
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    # Grouping by bar size keeps each worker's aggregation cache small and hot
+    combos = sorted(combos)
+    chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    try:
+        np.ndarray(prices.shape, dtype=np.float64, buffer=shm.buf)[:] = prices
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, len(prices), qty, cost)) as pool:
+            for future in as_completed([pool.submit(_run_chunk, c) for c in chunks]):
+                rows.extend(future.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def rank(results, by="pnl"):
+    ascending = by == "max_drawdown"
+    return results.sort_values([by, "max_drawdown"], ascending=[ascending, True]).reset_index(drop=True)
+
+
+def write_results(results, path):
+    """Parquet when the path asks for it and pyarrow is available, else CSV."""
+    if path.endswith(".parquet"):
+        try:
+            results.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path[:-len(".parquet")] + ".csv"
+            print(f"pyarrow not installed, writing {path} instead")
+    results.to_csv(path, index=False, float_format="%.6g")
+    return path
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Parallel ALMA crossover parameter sweep")
+    parser.add_argument("path", help="Tick store partition (ticks/<date>/<token>) or .npz/.csv ticks")
+    parser.add_argument("--mode", choices=("grid", "random"), default="grid")
+    parser.add_argument("--samples", type=int, default=1000, help="Random search size")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--qty", type=int, default=1)
+    parser.add_argument("--cost", type=float, default=0.0, help="Cost per order")
+    parser.add_argument("--rank-by", default="pnl", choices=("pnl", "realized_pnl", "max_drawdown", "trades", "wins"))
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default="sweep_results.csv")
+    args = parser.parse_args(argv)
+
+    prices, is_ticks = load_prices(args.path)
+    if not is_ticks:
+        parser.error("a sweep over bar sizes needs tick data, not a bar journal")
+    combos = grid() if args.mode == "grid" else random_combos(args.samples, seed=args.seed)
+
+    start = time.time()
+    results = rank(sweep(prices, combos, args.workers, args.qty, args.cost), args.rank_by)
+    elapsed = time.time() - start
+    path = write_results(results, args.out)
+    print(f"{len(results)} combinations over {len(prices)} ticks in {elapsed:.1f}s on {args.workers} workers -> {path}")
+    print(results.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,211 @@
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from logzero import logger
+
+# ================= TICK STORE LAYOUT =================
+# Raw ticks, columnar and zlib-compressed, partitioned by date and token:
+#
+#   ticks/2026-02-12/472789/093015_1770868215000_000001.npz   (ts_ms i8, ltp f8, qty i8, exchange_type i4)
+#
+# Each chunk is one writer flush for one token, named by the wall-clock time
+# of its first tick, the recorder's start time (ms) and a running counter, so
+# sorting file names sorts ticks and a restarted recorder never reuses a name.
+TICK_STORE_DIR = os.environ.get("TICK_STORE_DIR", "ticks")
+TICK_STORE_ENABLED = os.environ.get("TICK_STORE", "1") != "0"
+# A chunk is written once this many ticks are pending or CHUNK_SECONDS passed
+CHUNK_TICKS = int(os.environ.get("TICK_CHUNK_TICKS", 50000))
+CHUNK_SECONDS = float(os.environ.get("TICK_CHUNK_SECONDS", 30.0))
+TICK_COLUMNS = ("ts_ms", "ltp", "qty", "exchange_type")
+TICK_DTYPE = np.dtype([("ts_ms", "i8"), ("ltp", "f8"), ("qty", "i8"), ("exchange_type", "i4")])
+
+
+def partition_dir(token, date, root=TICK_STORE_DIR):
+    return os.path.join(root, str(date), str(token))
+
+
+class TickRecorder:
+    """
+    Batched tick capture. record() only appends a tuple to an in-memory
+    batch; a background thread turns batches into compressed chunks.
+    """
+
+    def __init__(self, root=TICK_STORE_DIR, chunk_ticks=CHUNK_TICKS, chunk_seconds=CHUNK_SECONDS):
+        self.root = root
+        self.chunk_ticks = chunk_ticks
+        self.chunk_seconds = chunk_seconds
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.session = int(time.time() * 1000)
+        self.counter = 0
+        self.written = 0
+
+    def record(self, token, exchange_type, ltp, qty, ts_ms):
+        with self.lock:
+            self.pending.append((token, ts_ms, ltp, qty, exchange_type))
+            full = len(self.pending) >= self.chunk_ticks
+        if full:
+            self.wake.set()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def writer(self):
+        while self.running:
+            self.wake.wait(self.chunk_seconds)
+            self.wake.clear()
+            self.flush()
+        # Never lose buffered ticks on shutdown
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            logger.error(f"Tick store write error ({len(batch)} ticks lost): {e}")
+
+    def write_batch(self, batch):
+        tokens = np.array([t[0] for t in batch])
+        rows = np.array([t[1:] for t in batch], dtype=np.float64)
+        for token in np.unique(tokens):
+            sel = rows[tokens == token]
+            ts_ms = sel[:, 0].astype(np.int64)
+            # A batch can straddle midnight: split by local date
+            days = np.array([datetime.fromtimestamp(ts / 1000).date().isoformat() for ts in ts_ms[[0, -1]]])
+            if days[0] == days[1]:
+                parts = [(days[0], slice(None))]
+            else:
+                day_of = np.array([datetime.fromtimestamp(ts / 1000).date().isoformat() for ts in ts_ms])
+                parts = [(d, day_of == d) for d in np.unique(day_of)]
+            for day, mask in parts:
+                self.write_chunk(token, day, ts_ms[mask], sel[mask, 1], sel[mask, 2], sel[mask, 3])
+
+    def write_chunk(self, token, day, ts_ms, ltp, qty, exchange_type):
+        folder = partition_dir(token, day, self.root)
+        os.makedirs(folder, exist_ok=True)
+        first = datetime.fromtimestamp(ts_ms[0] / 1000).strftime("%H%M%S")
+        while True:
+            self.counter += 1
+            path = os.path.join(folder, f"{first}_{self.session}_{self.counter:06d}.npz")
+            # os.replace would silently overwrite recorded ticks
+            if not os.path.exists(path):
+                break
+        temp_file = path + ".tmp"
+        with open(temp_file, "wb") as f:
+            np.savez_compressed(
+                f, ts_ms=ts_ms, ltp=ltp.astype(np.float64),
+                qty=qty.astype(np.int64), exchange_type=exchange_type.astype(np.int32),
+            )
+        os.replace(temp_file, path)
+        self.written += len(ts_ms)
+
+    def close(self):
+        if self.thread is None:
+            self.flush()
+            return
+        self.running = False
+        self.wake.set()
+        self.thread.join(timeout=10)
+        self.thread = None
+
+
+# ================= READING =================
+def list_dates(root=TICK_STORE_DIR):
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))) if os.path.isdir(root) else []
+
+
+def list_tokens(date, root=TICK_STORE_DIR):
+    folder = os.path.join(root, str(date))
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+
+def load_chunks(paths):
+    """Concatenate chunk files into one TICK_DTYPE array, ordered by file name."""
+    parts = []
+    for path in sorted(paths):
+        with np.load(path) as data:
+            part = np.empty(len(data["ts_ms"]), dtype=TICK_DTYPE)
+            for name in TICK_COLUMNS:
+                part[name] = data[name]
+            parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=TICK_DTYPE)
+
+
+def load_ticks(token, date=None, root=TICK_STORE_DIR, start_ms=None, end_ms=None):
+    """
+    All recorded ticks for a token, for one date or every date on disk,
+    optionally limited to [start_ms, end_ms).
+    """
+    dates = [date] if date else list_dates(root)
+    paths = []
+    for day in dates:
+        paths.extend(glob.glob(os.path.join(partition_dir(token, day, root), "*.npz")))
+    ticks = load_chunks(paths)
+    if start_ms is not None:
+        ticks = ticks[ticks["ts_ms"] >= start_ms]
+    if end_ms is not None:
+        ticks = ticks[ticks["ts_ms"] < end_ms]
+    return ticks
+
+
+def load_partition(path):
+    """Ticks from a partition directory (ticks/<date>/<token>) or a single chunk file."""
+    if os.path.isdir(path):
+        return load_chunks(glob.glob(os.path.join(path, "*.npz")))
+    return load_chunks([path])
+
+
+def load_replay(path, token=None):
+    """
+    Ticks to replay: (ticks, tokens), a time-ordered TICK_DTYPE array and a
+    parallel array of their token ids. `path` may be a date
+    directory (every token), a partition directory, a chunk/.npz file or a
+    .csv with ts_ms, ltp[, qty, token, exchange_type] columns.
+    """
+    parts, tokens = [], []
+    if os.path.isdir(path) and not glob.glob(os.path.join(path, "*.npz")):
+        # ticks/<date>: one partition per token
+        for tok in sorted(os.listdir(path)):
+            ticks = load_partition(os.path.join(path, tok))
+            parts.append(ticks)
+            tokens.append(np.full(len(ticks), tok))
+    elif path.lower().endswith(".csv"):
+        import pandas as pd
+        df = pd.read_csv(path)
+        ticks = np.empty(len(df), dtype=TICK_DTYPE)
+        ticks["ts_ms"] = df["ts_ms"]
+        ticks["ltp"] = df["ltp"] if "ltp" in df.columns else df["price"]
+        ticks["qty"] = df["qty"] if "qty" in df.columns else 1
+        ticks["exchange_type"] = df["exchange_type"] if "exchange_type" in df.columns else 0
+        parts.append(ticks)
+        tokens.append(df["token"].astype(str).to_numpy() if "token" in df.columns else np.full(len(df), str(token)))
+    else:
+        ticks = load_partition(path)
+        if token is None:
+            # Partition directories and chunk files are named ticks/<date>/<token>/...
+            folder = path if os.path.isdir(path) else os.path.dirname(path)
+            token = os.path.basename(os.path.normpath(folder))
+        parts.append(ticks)
+        tokens.append(np.full(len(ticks), str(token)))
+
+    if not parts:
+        return np.empty(0, dtype=TICK_DTYPE), np.empty(0, dtype=str)
+    ticks = np.concatenate(parts)
+    tokens = np.concatenate(tokens)
+    # Stable sort keeps the recorded arrival order for equal timestamps
+    order = np.argsort(ticks["ts_ms"], kind="stable")
+    return ticks[order], tokens[order]
@@ -0,0 +1,198 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import requests
+from logzero import logger
+from bars import BAR_DTYPE, TICK_BAR_SIZE, make_builder
+from journal import JournalReader, journal_path
+from indicators import ALMA_PERIOD
+
+# ================= WARM START CONFIG =================
+# Before the first live tick every instrument loads prior bars and bulk-computes
+# their ALMA, so the indicator (and the strategy) is valid from the first bar.
+# Sources are tried in order until one yields a full ALMA window:
+#   journal - the previous session's bar journal (same bar type only)
+#   ticks   - recorded ticks from the tick store, rebuilt into bars
+#   candles - AngelOne getCandleData, cached on disk
+WARM_SOURCES = tuple(s.strip() for s in os.environ.get("WARM_START", "journal,ticks,candles").split(",")
+                     if s.strip() and s.strip() != "0")
+WARM_MAX_AGE_DAYS = float(os.environ.get("WARM_MAX_AGE_DAYS", 5))  # older history is ignored
+WARM_TICK_DAYS = int(os.environ.get("WARM_TICK_DAYS", 3))  # tick store dates scanned, newest first
+
+CANDLE_URL = "https://apiconnect.angelone.in/rest/secure/angelbroking/historical/v1/getCandleData"
+CANDLE_CACHE_DIR = "candles"
+CANDLE_CACHE_SECONDS = float(os.environ.get("CANDLE_CACHE_SECONDS", 300))
+CANDLE_DAYS = int(os.environ.get("CANDLE_DAYS", 5))
+CANDLE_TIMEOUT = 10
+# SmartAPI exchangeType -> getCandleData exchange
+CANDLE_EXCHANGES = {1: "NSE", 2: "NFO", 3: "BSE", 4: "BFO", 5: "MCX", 7: "NCDEX", 13: "CDS"}
+# Seconds per candle -> interval name; tick/volume/range/renko bars warm from one-minute candles
+CANDLE_INTERVALS = {60: "ONE_MINUTE", 180: "THREE_MINUTE", 300: "FIVE_MINUTE", 600: "TEN_MINUTE",
+                    900: "FIFTEEN_MINUTE", 1800: "THIRTY_MINUTE", 3600: "ONE_HOUR"}
+
+
+def _bars(times, open_, high, low, close, volume):
+    bars = np.zeros(len(times), dtype=BAR_DTYPE)
+    bars["time"], bars["open"], bars["high"], bars["low"] = times, open_, high, low
+    bars["close"], bars["volume"] = close, volume
+    bars["alma"] = np.nan
+    return bars
+
+
+def _fresh(bars):
+    return len(bars) and bars["time"][-1] >= time.time() - WARM_MAX_AGE_DAYS * 86400
+
+
+# ================= SOURCES =================
+def journal_history(token_id, exchange_type, bar_type, path=None):
+    """Bars from the previous session's journal, if it was written for the same bar type."""
+    result = JournalReader(path or journal_path(token_id)).tail()
+    if result is None:
+        return None
+    header, bars, _ = result
+    # Journals from before bar types were recorded hold the default tick bars
+    if header.get("bar_type", f"tick:{TICK_BAR_SIZE}") != bar_type:
+        return None
+    return bars
+
+
+def ticks_history(token_id, exchange_type, bar_type, root=None):
+    """Recorded ticks of the last WARM_TICK_DAYS dates, rebuilt into `bar_type` bars."""
+    from tickstore import TICK_STORE_DIR, list_dates, load_ticks
+    root = root or TICK_STORE_DIR
+    today = datetime.now().date().isoformat()
+    dates = [d for d in list_dates(root) if d <= today][-WARM_TICK_DAYS:]
+    if not dates:
+        return None
+    ticks = np.concatenate([load_ticks(token_id, d, root) for d in dates])
+    if not len(ticks):
+        return None
+    return rebuild_bars(ticks, bar_type)
+
+
+def rebuild_bars(ticks, bar_type):
+    """TICK_DTYPE ticks -> bars, exactly as the live builder would have closed them."""
+    builder = make_builder(bar_type)
+    if builder.kind == "tick":
+        from backtest import aggregate_ticks
+        b = aggregate_ticks(ticks["ltp"], ticks["qty"], ticks["ts_ms"] // 1000, builder.size)
+        return _bars(b["time"], b["open"], b["high"], b["low"], b["close"], b["volume"])
+    # Path-dependent bar types have to be streamed
+    rows = []
+    for ts_ms, ltp, qty in zip(ticks["ts_ms"].tolist(), ticks["ltp"].tolist(), ticks["qty"].tolist()):
+        rows.extend(builder.update(ltp, qty, ts_ms / 1000))
+    if not rows:
+        return None
+    return _bars(*np.array(rows, dtype=np.float64).T)
+
+
+def candle_history(token_id, exchange_type, bar_type, auth_file="auth.json"):
+    """Historical candles from AngelOne, reused from CANDLE_CACHE_DIR for CANDLE_CACHE_SECONDS."""
+    builder = make_builder(bar_type)
+    interval = CANDLE_INTERVALS.get(int(builder.size), "ONE_MINUTE") if builder.kind == "time" else "ONE_MINUTE"
+    exchange = CANDLE_EXCHANGES.get(int(exchange_type))
+    if exchange is None:
+        return None
+    cache = os.path.join(CANDLE_CACHE_DIR, f"{token_id}_{interval}.json")
+    data = None
+    try:
+        with open(cache, "r") as f:
+            cached = json.load(f)
+        if time.time() - cached["fetched"] < CANDLE_CACHE_SECONDS:
+            data = cached["data"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if data is None:
+        data = fetch_candles(token_id, exchange, interval, auth_file)
+        if data is None:
+            return None
+        os.makedirs(CANDLE_CACHE_DIR, exist_ok=True)
+        temp_file = cache + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump({"fetched": time.time(), "data": data}, f)
+        os.replace(temp_file, cache)
+
+    if not data:
+        return None
+    # [timestamp, open, high, low, close, volume]; bars are stamped with the candle start
+    times = [int(datetime.fromisoformat(row[0]).timestamp()) for row in data]
+    o, h, l, c, v = np.array([row[1:6] for row in data], dtype=np.float64).T
+    return _bars(times, o, h, l, c, v)
+
+
+def fetch_candles(token_id, exchange, interval, auth_file="auth.json"):
+    try:
+        with open(auth_file, "r") as f:
+            auth = json.load(f)
+    except (OSError, ValueError):
+        return None
+    now = datetime.now()
+    payload = {
+        "exchange": exchange,
+        "symboltoken": str(token_id),
+        "interval": interval,
+        "fromdate": (now - timedelta(days=CANDLE_DAYS)).strftime("%Y-%m-%d %H:%M"),
+        "todate": now.strftime("%Y-%m-%d %H:%M"),
+    }
+    headers = {
+        'Authorization': auth["Authorization"],
+        'Content-Type': 'application/json', 'Accept': 'application/json',
+        'X-UserType': 'USER', 'X-SourceID': 'WEB',
+        'X-ClientLocalIP': '127.0.0.1', 'X-ClientPublicIP': '127.0.0.1',
+        'X-MACAddress': 'MAC_ADDRESS', 'X-PrivateKey': auth["api_key"],
+    }
+    try:
+        response = requests.post(CANDLE_URL, headers=headers, data=json.dumps(payload), timeout=CANDLE_TIMEOUT)
+        resp_json = response.json()
+    except Exception as e:
+        logger.error(f"[{token_id}] Candle fetch error: {e}")
+        return None
+    if not resp_json.get("status"):
+        logger.error(f"[{token_id}] Candle fetch refused: {resp_json.get('message')}")
+        return None
+    return resp_json.get("data") or []
+
+
+SOURCES = {
+    "journal": journal_history,
+    "ticks": ticks_history,
+    "candles": candle_history,
+}
+
+
+def load_history(token_id, exchange_type, bar_type, sources=WARM_SOURCES, min_bars=ALMA_PERIOD, journal=None):
+    """
+    Prior bars for one instrument as a BAR_DTYPE array, and the source they
+    came from. The first source with `min_bars` recent bars wins; otherwise
+    the longest recent history found. `journal` is the series' own journal
+    file (extra bar types do not write to the primary one).
+    """
+    best, best_source = np.empty(0, dtype=BAR_DTYPE), None
+    for name in sources:
+        try:
+            if name == "journal" and journal:
+                bars = journal_history(token_id, exchange_type, bar_type, journal)
+            else:
+                bars = SOURCES[name](token_id, exchange_type, bar_type)
+        except Exception as e:
+            logger.error(f"[{token_id}] Warm start from {name} failed: {e}")
+            continue
+        if bars is None or not _fresh(bars):
+            continue
+        if len(bars) > len(best):
+            best, best_source = bars, name
+        if len(best) >= min_bars:
+            break
+    return best, best_source
+
+
+def warm_store(store, engine, history):
+    """Backfill `engine` over the whole history and load its newest bars into `store`."""
+    alma = engine.backfill(history["close"])
+    keep = history[-store.capacity:]
+    for row, value in zip(keep.tolist(), alma[-len(keep):].tolist()):
+        store.append(row[0], row[1], row[2], row[3], row[4], row[5], value, row[7])
+    return len(history)